@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the bulk-actions of the grid. An action is run on the rows the client selected, which may
+be all rows matching the filters and the search of the grid. The rows are never loaded for this: Simple actions
+are a single update() or delete() of the filtered queryset, heavier actions are run in chunks of primary keys
+and report their progress after each chunk. The actions are configured as the setting `actions` of the grid
+and run with Grid.action.
+"""
+
+# Django imports
+try:
+    from django.db.transaction import atomic
+except ImportError:
+    # Before django 1.6
+    from django.db.transaction import commit_on_success as atomic
+
+
+class BulkAction(object):
+    """
+    Base class of the bulk-actions. Subclasses implement iterate, which runs the action on the queryset and
+    yields the amount of rows processed so far.
+    """
+
+    # If True, the action reports its progress after each chunk (see Grid.action)
+    reports_progress = False
+
+    def __init__(self, label, confirm=None):
+        """
+        @param label The label of the button of the action
+        @param confirm The question the user has to confirm before the action is run or None
+        """
+        self.__label = label
+        self.__confirm = confirm
+
+    def get_label(self):
+        return self.__label
+
+    def get_confirm(self):
+        return self.__confirm
+
+    def iterate(self, queryset):
+        """
+        Run the action on all rows of the queryset
+        @param queryset The filtered queryset of the selected rows
+        @return Generator yielding the amount of rows processed so far
+        """
+        raise NotImplementedError()
+
+    def run(self, queryset, progress=None):
+        """
+        Run the action on all rows of the queryset
+        @param queryset The filtered queryset of the selected rows
+        @param progress Callable getting the amount of rows processed so far or None
+        @return int The amount of processed rows
+        """
+        done = 0
+        for done in self.iterate(queryset):
+            if progress != None:
+                progress(done)
+        return done
+
+
+class UpdateAction(BulkAction):
+    """ Update the fields of all rows with a single query (like setting a flag) """
+
+    def __init__(self, label, values, confirm=None):
+        """
+        @param values dict with the new values of the fields. The values may also be F-expressions
+        """
+        super(UpdateAction, self).__init__(label, confirm)
+        self.__values = values
+
+    def iterate(self, queryset):
+        yield queryset.update(**self.__values)
+
+
+class DeleteAction(BulkAction):
+    """ Delete all rows. Django still collects the related objects, that have to be deleted along with them """
+
+    def __init__(self, label=u"Löschen", confirm=u"Sollen die ausgewählten Zeilen wirklich gelöscht werden?"):
+        super(DeleteAction, self).__init__(label, confirm)
+
+    def iterate(self, queryset):
+        count = queryset.count()
+        queryset.delete()
+        yield count
+
+
+class BatchAction(BulkAction):
+    """
+    Run a function on chunks of the rows. Only the primary keys are fetched, the chunks are selected by
+    keyset-pagination on the primary key, so rows changed by the function don't shift the following chunks.
+    Each chunk is run in its own transaction, so the finished chunks are kept, if a later one fails.
+    """
+    reports_progress = True
+
+    def __init__(self, label, func, chunk_size=500, confirm=None):
+        """
+        @param func Function getting the queryset of a chunk
+        @param chunk_size The amount of rows in each chunk
+        """
+        super(BatchAction, self).__init__(label, confirm)
+        self.__func = func
+        self.__chunk_size = chunk_size
+
+    def iterate(self, queryset):
+        manager = queryset.model._default_manager
+        keys = queryset.order_by('pk').values_list('pk', flat=True)
+        last = None
+        done = 0
+        while True:
+            chunk = list((keys if last == None else keys.filter(pk__gt=last))[:self.__chunk_size])
+            if not chunk:
+                break
+            with atomic():
+                self.__func(manager.filter(pk__in=chunk))
+            done += len(chunk)
+            last = chunk[-1]
+            yield done
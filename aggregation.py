@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the aggregation of the columns. A column may declare an aggregate (like sum or avg), which
+is computed by the database over all filtered rows and displayed in the footer of the grid.
+"""
+
+# Django imports
+from django.db.models import Avg, Count, Max, Min, Sum
+
+# Grid-Imports
+from exceptions import GridConfigurationException
+
+
+# The aggregates a column may declare
+AGGREGATES = {
+    'sum': Sum,
+    'avg': Avg,
+    'min': Min,
+    'max': Max,
+    'count': Count,
+}
+
+
+def compute_aggregates(queryset, columns):
+    """
+    Compute the aggregates of the columns with a single aggregate-query. No rows are loaded.
+    @param queryset The filtered (not paged) queryset
+    @param columns The (bound) columns declaring an aggregate
+    @return dict column-id: aggregated value
+    """
+    if not columns:
+        return {}
+
+    aggregates = {}
+    for column in columns:
+        aggregate = AGGREGATES.get(column.get_aggregate())
+        if aggregate == None:
+            raise GridConfigurationException("Unknown aggregate %s of column %s" % (column.get_aggregate(), column.get_id()))
+        aggregates["grid_aggregate_%s" % column.get_id()] = aggregate(column.get_lookup())
+
+    values = queryset.order_by().aggregate(**aggregates)
+    return dict((c.get_id(), values["grid_aggregate_%s" % c.get_id()]) for c in columns)
@@ -0,0 +1,9 @@
+"""
+Benchmarks of the grid. They run on a bundled minimal settings-module with sqlite and synthetic data,
+so the render- and query-paths can be compared between changes. Run them with
+
+    DJANGO_SETTINGS_MODULE=grid_widget.benchmarks.settings \
+        python -m grid_widget.benchmarks --rows 10000 --columns 5,20,100 --output results.json
+
+and compare a later run with `--compare results.json`. See suite.py for the measured cases.
+"""
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line interface of the benchmarks, see suite.py
+"""
+
+# Lib-Imports
+import argparse
+import sys
+
+
+def main():
+    # The package of the grid (like grid_widget), this is run with `python -m <package>.benchmarks`
+    package = __package__.rsplit('.', 1)[0]
+
+    parser = argparse.ArgumentParser(description="Benchmark the render- and query-paths of the grid")
+    parser.add_argument('--rows', type=int, default=10000, help="The amount of synthetic rows")
+    parser.add_argument('--columns', default="5,20,50,100", help="Comma-separated amounts of columns of the benchmarked grids")
+    parser.add_argument('--repeat', type=int, default=5, help="How often each case is measured")
+    parser.add_argument('--export-limit', type=int, default=100000, help="The maximum amount of rows exported")
+    parser.add_argument('--only', default=None, help="Only run the cases whose name starts with this prefix")
+    parser.add_argument('--output', default=None, help="Write the results as json to this file instead of stdout")
+    parser.add_argument('--compare', default=None, help="Compare the results with an earlier output-file")
+    parser.add_argument('--threshold', type=float, default=1.2, help="The ratio to the earlier result, that counts as regression")
+    args = parser.parse_args()
+
+    suite = __import__('%s.benchmarks.suite' % package, fromlist=['suite'])
+    results = suite.run(args.rows, [int(c) for c in args.columns.split(',')], args.repeat, args.export_limit, args.only)
+    suite.write(results, args.output)
+
+    if args.compare:
+        regressions = suite.compare(results, suite.load(args.compare), args.threshold)
+        for name, ratio in regressions:
+            sys.stderr.write("Regression: %s is %.2f times slower\n" % (name, ratio))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+The synthetic models the benchmarks are run with. BenchItem has a field for each kind of column.
+"""
+
+# Django imports
+from django.db import models
+
+
+class BenchOwner(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class BenchItem(models.Model):
+    title = models.CharField(max_length=100, db_index=True)
+    category = models.CharField(max_length=20)
+    amount = models.IntegerField(db_index=True)
+    price = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    created = models.DateField(db_index=True)
+    active = models.BooleanField(default=True)
+    owner = models.ForeignKey(BenchOwner)
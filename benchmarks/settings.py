@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal django-settings for the benchmarks. The database is a sqlite-file, which is kept between runs,
+so the synthetic data only has to be generated once (see GRID_BENCH_DB).
+"""
+
+# Lib-Imports
+import os
+import tempfile
+
+
+# The name of the package of the grid (like grid_widget)
+PACKAGE = __name__.rsplit('.', 2)[0]
+
+DEBUG = False
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('GRID_BENCH_DB', os.path.join(tempfile.gettempdir(), 'grid_benchmark.sqlite3')),
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+INSTALLED_APPS = (
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    '%s.benchmarks' % PACKAGE,
+)
+
+TEMPLATE_DIRS = (
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates'),
+)
+
+TEMPLATE_CONTEXT_PROCESSORS = (
+    'django.core.context_processors.static',
+)
+
+STATIC_URL = '/static/'
+SECRET_KEY = 'grid-benchmarks'
+USE_TZ = False
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+The benchmark-suite of the grid. It generates the synthetic data, builds grids with the requested amount of
+columns (cycling through all kinds of columns) and measures the cases:
+
+    init            Render the grid in init-mode
+    view            Prepare and render the first page
+    json            Prepare and render the first page as json
+    depth.offset    Render a deep page with offset-pagination
+    depth.keyset    Render a deep page with keyset-pagination
+    filter          Render the first page with different combinations of filters
+    export          Export the filtered rows as csv (throughput in rows per second)
+
+Each case is measured `repeat` times. The results contain the minimum and median time, the amount of
+queries and the size of the output, so they can be compared between runs.
+"""
+
+# Lib-Imports
+import datetime
+import platform
+import random
+import simplejson
+import sys
+import timeit
+from decimal import Decimal
+
+# Django imports
+import django
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+
+# Grid-Imports
+from ..columns import (BooleanColumn, ChoiceColumn, CurrencyColumn, DateColumn, EditColumn, NumberColumn,
+                       TextColumn)
+from ..grid import Grid
+from ..pagination import KeysetPaginator
+from .models import BenchItem, BenchOwner
+
+
+# The kinds of columns the grids are built of. Each entry creates a new column-instance
+COLUMN_KINDS = [
+    lambda: TextColumn(db_field='title', filterable=True),
+    lambda: ChoiceColumn(db_field='category'),
+    lambda: NumberColumn(db_field='amount'),
+    lambda: CurrencyColumn(db_field='price', nullable=True),
+    lambda: DateColumn(db_field='created'),
+    lambda: BooleanColumn(db_field='active'),
+    lambda: TextColumn(db_field='owner.name'),
+    lambda: EditColumn(url=lambda row: "/edit/%d/" % row.pk),
+]
+
+# The filters of the filter-case
+FILTERS = {
+    'text': [{'nr': 0, 'id': 'c0', 'mode': '~', 'values': ['7']}],
+    'number': [{'nr': 0, 'id': 'c2', 'mode': '-=', 'values': ['100', '500']}],
+    'date': [{'nr': 0, 'id': 'c4', 'mode': '=', 'values': ['2012']}],
+    'choice': [{'nr': 0, 'id': 'c1', 'mode': '=', 'values': ['cat3']}],
+}
+FILTERS['combined'] = FILTERS['text'] + FILTERS['number'] + FILTERS['date'] + FILTERS['choice']
+
+CATEGORIES = ["cat%d" % i for i in range(10)]
+PER_PAGE = 20
+
+
+# ============================================================================================
+# Data
+
+
+def generate(rows, chunk_size=10000):
+    """
+    Create the tables and fill them with the synthetic rows. The data is only generated, if the
+    table doesn't already contain the requested amount of rows. The rows are inserted with raw
+    statements, because creating millions of objects would take much longer than the benchmarks.
+    @param rows The amount of rows
+    """
+    call_command('syncdb', interactive=False, verbosity=0)
+    if BenchItem.objects.count() == rows:
+        return
+
+    BenchItem.objects.all().delete()
+    BenchOwner.objects.all().delete()
+    owners = [BenchOwner.objects.create(name="Owner %d" % i).pk for i in range(100)]
+
+    rnd = random.Random(rows)
+    start = datetime.date(2010, 1, 1)
+    table = BenchItem._meta.db_table
+    sql = ('INSERT INTO "%s" ("title", "category", "amount", "price", "created", "active", "owner_id") '
+           'VALUES (%%s, %%s, %%s, %%s, %%s, %%s, %%s)' % table)
+    cursor = connection.cursor()
+    for offset in range(0, rows, chunk_size):
+        values = []
+        for nr in range(offset, min(rows, offset + chunk_size)):
+            values.append(("Item %d" % nr, rnd.choice(CATEGORIES), rnd.randint(0, 1000),
+                           None if nr % 10 == 0 else str(Decimal(rnd.randint(0, 100000)) / 100),
+                           start + datetime.timedelta(days=rnd.randint(0, 5 * 365)), rnd.random() > 0.3,
+                           rnd.choice(owners)))
+        cursor.executemany(sql, values)
+        transaction.commit_unless_managed()
+
+
+# ============================================================================================
+# Grids
+
+
+def build_grid(columns):
+    """
+    Create a grid-class with the given amount of columns, which cycle through COLUMN_KINDS.
+    The ids of the columns are c0, c1, ...
+    """
+    attrs = {
+        'grid_id': "bench%d" % columns,
+        'url': "/bench/",
+        'entries_per_page': PER_PAGE,
+        '__module__': __name__,
+    }
+    for nr in range(columns):
+        attrs["c%d" % nr] = COLUMN_KINDS[nr % len(COLUMN_KINDS)]()
+    return type(Grid)("BenchGrid%d" % columns, (Grid,), attrs)
+
+
+def _post(state):
+    return RequestFactory().post('/bench/', {'grid_data': simplejson.dumps(state)})
+
+
+# ============================================================================================
+# Measuring
+
+
+def measure(name, func, repeat, **info):
+    """
+    Measure the callable, which returns the rendered output (or its size)
+    @param name The name of the case
+    @param func The callable without arguments
+    @param repeat How often the callable is run
+    @param info Additional values stored in the result (like the amount of columns)
+    @return dict The result
+    """
+    timings = []
+    for i in range(repeat):
+        begin = timeit.default_timer()
+        output = func()
+        timings.append(timeit.default_timer() - begin)
+
+    # Count the queries in a separate run, so logging them doesn't affect the timings
+    connection.use_debug_cursor = True
+    del connection.queries[:]
+    func()
+    queries = len(connection.queries)
+    connection.use_debug_cursor = None
+    del connection.queries[:]
+
+    timings.sort()
+    result = dict(info, name=name, min_ms=timings[0] * 1000, median_ms=timings[len(timings) // 2] * 1000,
+                  queries=queries, size=output if isinstance(output, (int, long)) else len(output))
+    sys.stderr.write("%-40s %10.2f ms %5d queries\n" % (name, result['median_ms'], queries))
+    return result
+
+
+def _deep_cursor(queryset, page):
+    """ Create the cursor to the given page of the unsorted grid with keyset-pagination """
+    previous = queryset.order_by('pk')[(page - 1) * PER_PAGE - 1]
+    return KeysetPaginator(queryset, PER_PAGE, []).encode_cursor(previous, 'next')
+
+
+def _export(grid_class, queryset, state):
+    """ Export the rows and return the size of the generated file """
+    response = grid_class.export(RequestFactory().get('/bench/', {'grid_data': simplejson.dumps(state)}),
+                                 queryset, 'csv')
+    return sum(len(chunk) for chunk in response)
+
+
+def run(rows, column_counts, repeat=5, export_limit=100000, only=None):
+    """
+    Run all benchmarks
+    @param rows The amount of synthetic rows
+    @param column_counts List with the amounts of columns of the benchmarked grids
+    @param repeat How often each case is measured
+    @param export_limit The maximum amount of rows exported
+    @param only Only run the cases whose name starts with this prefix
+    @return dict with the keys meta and results
+    """
+    generate(rows)
+    queryset = BenchItem.objects.all()
+    pages = rows // PER_PAGE
+    depths = [d for d in (1, 10, 100, 1000, 10000, 100000) if d <= pages]
+
+    results = []
+    for columns in column_counts:
+        grid_class = build_grid(columns)
+        info = {'columns': columns, 'rows': rows}
+        cases = [
+            ("init", lambda: grid_class.init(RequestFactory().get('/')).render(), {}),
+            ("view", lambda: grid_class.view(_post({}), queryset).render(), {}),
+            ("json", lambda: grid_class.view(_post({'format': 'json'}), queryset).render(), {}),
+        ]
+        for depth in depths:
+            cases.append(("depth.offset.%d" % depth,
+                          lambda depth=depth: grid_class.view(_post({'page': depth}), queryset).render(), {'page': depth}))
+            # The cursor is looked up once, so only the seek of the page itself is measured
+            cursor = _deep_cursor(queryset, depth) if depth > 1 else None
+            cases.append(("depth.keyset.%d" % depth,
+                          lambda depth=depth, cursor=cursor: grid_class.view(_post({'page': depth, 'cursor': cursor}), queryset,
+                                                                             settings={'keyset_pagination': True}).render(),
+                          {'page': depth}))
+        for filter_name, filters in sorted(FILTERS.items()):
+            cases.append(("filter.%s" % filter_name,
+                          lambda filters=filters: grid_class.view(_post({'filter': filters}), queryset).render(), {}))
+        exported = queryset.filter(pk__in=queryset.order_by('pk').values_list('pk', flat=True)[:export_limit])
+        cases.append(("export.csv", lambda: _export(grid_class, exported, {}), {'exported': min(rows, export_limit)}))
+
+        for name, func, extra in cases:
+            name = "%s.%d" % (name, columns)
+            if only == None or name.startswith(only):
+                results.append(measure(name, func, repeat, **dict(info, **extra)))
+
+    # The throughput of the exports
+    for result in results:
+        if 'exported' in result:
+            result['rows_per_second'] = result['exported'] / (result['median_ms'] / 1000.0)
+
+    meta = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'rows': rows,
+        'repeat': repeat,
+        'date': datetime.datetime.now().isoformat(),
+    }
+    return {'meta': meta, 'results': results}
+
+
+# ============================================================================================
+# Results
+
+
+def write(results, filename=None):
+    """ Write the results as json to the file or stdout """
+    data = simplejson.dumps(results, indent=2, sort_keys=True)
+    if filename == None:
+        sys.stdout.write(data + "\n")
+    else:
+        with open(filename, 'w') as output:
+            output.write(data)
+
+
+def load(filename):
+    """ Load the results written by write """
+    with open(filename) as data:
+        return simplejson.load(data)
+
+
+def compare(results, previous, threshold=1.2):
+    """
+    Compare the results with an earlier run
+    @param results The current results
+    @param previous The earlier results
+    @param threshold The ratio of the median times, that counts as regression
+    @return list of tuples (name, ratio) of the regressed cases
+    """
+    earlier = dict((r['name'], r) for r in previous['results'])
+    regressions = []
+    for result in results['results']:
+        before = earlier.get(result['name'])
+        if before != None and before['median_ms'] > 0:
+            ratio = result['median_ms'] / before['median_ms']
+            if ratio > threshold:
+                regressions.append((result['name'], ratio))
+    return regressions
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the helpers the grid uses to cache data with the cache-backends of django
+"""
+
+# Lib-Imports
+import hashlib
+import simplejson
+import threading
+import time
+from collections import OrderedDict
+
+# Django imports
+from django.core.cache import get_cache as django_get_cache
+from django.db.models.signals import post_delete, post_save
+
+# Grid-Imports
+from serialization import json_default
+
+
+# The cache-backends are created once for each alias
+_backends = {}
+
+def get_cache(alias='default'):
+    """ Return the django cache-backend with the given alias """
+    backend = _backends.get(alias)
+    if backend == None:
+        backend = _backends[alias] = django_get_cache(alias)
+    return backend
+
+
+def make_key(prefix, *parts):
+    """
+    Create a cache-key from the given parts. The parts are serialized as json (with sorted keys),
+    so equal parts always result in the same key. The result is hashed, so it is always a valid key.
+    @param prefix A readable prefix for the key (like the id of the grid)
+    @param parts Any json-serializable objects
+    @return String The key
+    """
+    data = simplejson.dumps(parts, sort_keys=True, default=json_default)
+    return "grid:%s:%s" % (prefix, hashlib.md5(data.encode('utf-8') if isinstance(data, unicode) else data).hexdigest())
+
+
+def get_generation(cache, grid_class, name):
+    """
+    Return the generation of the cached data (like views or facets) of a grid-class. It is added to the
+    keys of the data, so increasing it drops all cached entries at once.
+    @param cache The django cache-backend
+    @param grid_class The class of the grid
+    @param name The name of the cached data
+    """
+    return cache.get(_generation_key(grid_class, name), 0)
+
+
+def increase_generation(cache, grid_class, name):
+    """ Increase the generation of the cached data of a grid-class (see get_generation) """
+    key = _generation_key(grid_class, name)
+    if not cache.add(key, 1, 30 * 24 * 3600):
+        cache.incr(key)
+
+
+def _generation_key(grid_class, name):
+    return "grid:%s.%s:%s:generation" % (grid_class.__module__, grid_class.__name__, name)
+
+
+def invalidate_on_change(model, grid_class, *caches):
+    """
+    Invalidate the caches of the grid-class (like a GridCache or FacetIndex), whenever an object of the
+    model is saved or deleted. Bulk-updates don't send signals, so they must be invalidated manually.
+    @param model The model displayed by the grid
+    @param grid_class The class of the grid
+    @param caches The objects offering invalidate(grid_class)
+    """
+    def handler(sender, **kw):
+        for cache in caches:
+            cache.invalidate(grid_class)
+    
+    uid = "grid:%s.%s:%s" % (grid_class.__module__, grid_class.__name__, id(caches))
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+
+
+class LocalLRUCache(object):
+    """
+    A small in-process cache, that keeps the most recently used entries. It is used in front of the
+    django cache-backend, so frequently requested entries don't have to be transferred every time.
+    The cache is thread-safe.
+    """
+
+    def __init__(self, size=100, timeout=60):
+        """
+        @param size The maximum amount of entries
+        @param timeout The time in seconds an entry is valid
+        """
+        self.__size = size
+        self.__timeout = timeout
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry == None or entry[0] < time.time():
+                return None
+            # Reinsert the entry, so it becomes the most recently used
+            self.__entries[key] = entry
+            return entry[1]
+
+    def set(self, key, value):
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (time.time() + self.__timeout, value)
+            while len(self.__entries) > self.__size:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+
+class GridCache(object):
+    """
+    Cache for the rendered view of grids. It is configured as the setting `view_cache` of the grid.
+    The key consists of the grid-class, the queryset and the settings passed to the view, the normalized
+    state sent by the client (filters, sorting, page and the extra callback-params) and a version. The version may be a value or a callable, which gets
+    the request (like the latest modification-date of the model). Additionally each grid-class has a generation,
+    which can be increased with invalidate (e.g. in a signal-handler) to drop all cached views of the grid.
+    The views are stored in a local LRU-cache of each process and in the django cache-backend.
+    """
+
+    def __init__(self, timeout=60, cache='default', local_size=100, version=None):
+        """
+        @param timeout The time in seconds a rendered view is cached
+        @param cache The alias of the django cache-backend to use
+        @param local_size The amount of views kept in the local cache. If 0 the local cache is disabled
+        @param version A value or callable (getting the request) that is added to the key
+        """
+        self.__timeout = timeout
+        self.__cache = cache
+        self.__version = version
+        self.__local = LocalLRUCache(local_size, timeout) if local_size else None
+
+    def make_key(self, grid, request, queryset, state, settings=None):
+        """
+        Create the key for the rendered view
+        @param grid The grid that is rendered
+        @param request The current request
+        @param queryset The queryset passed to the view. It may be limited (like to the rows of the user)
+        @param state The normalized state of the grid
+        @param settings The settings passed to the view, which override the ones of the grid-class, or None
+        @return String the key
+        """
+        grid_class = type(grid)
+        version = self.__version(request) if callable(self.__version) else self.__version
+        generation = get_generation(get_cache(self.__cache), grid_class, 'view')
+        
+        # The ordering of the queryset is replaced by the sorting of the grid, so it is removed
+        sql, params = queryset.order_by().query.sql_with_params()
+        
+        # The settings may contain any objects (like the backends or callables), so their repr is used
+        overrides = [(name, repr(value)) for name, value in sorted((settings or {}).items())]
+        return make_key("%s:view" % grid.get_id(), grid_class.__module__, grid_class.__name__, queryset.db, sql, params,
+                        overrides, state, version, generation)
+
+    def get(self, key):
+        """ Return the cached view or None """
+        value = self.__local.get(key) if self.__local else None
+        if value == None:
+            value = get_cache(self.__cache).get(key)
+            if value != None and self.__local:
+                self.__local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        """ Store the rendered view """
+        if self.__local:
+            self.__local.set(key, value)
+        get_cache(self.__cache).set(key, value, self.__timeout)
+
+    def invalidate(self, grid_class):
+        """ Drop all cached views of the grid-class by increasing its generation """
+        increase_generation(get_cache(self.__cache), grid_class, 'view')
+        if self.__local:
+            self.__local.clear()
+
+
+class StateCache(object):
+    """
+    Caches data computed from all filtered rows of a grid (like facets or aggregates) for each filtered
+    queryset and filter-state (see state.filter_state), so paging and sorting don't compute it again. It is used for the settings
+    `aggregate_cache` of the grid and by the FacetIndex. invalidate (or invalidate_on_change) drops the
+    cached data of a grid-class, once its data changed.
+    """
+
+    def __init__(self, timeout=300, cache='default', name='state'):
+        """
+        @param timeout The time in seconds the data is cached
+        @param cache The alias of the django cache-backend to use
+        @param name The name of the cached data, which is part of the keys
+        """
+        self.__timeout = timeout
+        self.__cache = cache
+        self.__name = name
+
+    def get(self, grid, queryset, state, compute):
+        """
+        Return the cached data or compute and store it
+        @param grid The grid that is rendered
+        @param queryset The filtered queryset the data is computed from
+        @param state The normalized filter-state of the grid and anything else the data depends on
+        @param compute Callable returning the data, if it isn't cached
+        """
+        cache = get_cache(self.__cache)
+        grid_class = type(grid)
+        # The queryset passed to the grid may be limited (like to the rows of the user), so its sql is part
+        # of the key as well. The ordering doesn't change the data, so it is removed
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = make_key("%s:%s" % (grid.get_id(), self.__name), grid_class.__module__, grid_class.__name__,
+                       queryset.db, sql, params, state, get_generation(cache, grid_class, self.__name))
+        value = cache.get(key)
+        if value == None:
+            value = compute()
+            cache.set(key, value, self.__timeout)
+        return value
+
+    def invalidate(self, grid_class):
+        """ Drop all cached data of the grid-class by increasing its generation """
+        increase_generation(get_cache(self.__cache), grid_class, self.__name)
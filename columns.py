@@ -2,41 +2,60 @@
 
 # Django Imports
 from django.template.loader import render_to_string
+from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.template.context import RequestContext
+from django.utils.translation import get_language
 
-#from columns_filter import Filter
 #from columns_width import Width
-#from model_base import InvalidFilterException
 
 class Width(object):
     NORMAL = 1
     ICON = 2
 
-from datetime import date
+from datetime import date, timedelta
 import re
 
 # Grid Imports
-from resource_handler import GridResourceHandler
+from columns_filter import Filter
+from facets import format_date_bucket
+from formatters import compile_date, compile_number, locale_separators
+from exceptions import InvalidFilterException
+from resource_handler import get_resource_handler
+from search import highlight
+from serialization import json_value
 
 # Project-settings
 from django.conf import settings as project_settings
 
 
+# The parts of the column-header, which depend on the request. While the static part of the header is rendered,
+# they are replaced by markers, which are split off afterwards and filled in for each request
+HEAD_PARTS = ('sort_icon', 'active_filters', 'filterwidget', 'facets')
+_HEAD_MARKER = u"\x00grid_head_%s\x00"
+_HEAD_MARKER_RE = re.compile(u"\x00grid_head_(\\w+)\x00")
+
+
 class Column(object):
     """
-    This represents the basic renderer for columns. It contains a render_head- and render_content-method
-    that will render the data and return the html-code for this column
+    This represents the basic renderer for columns. It contains a render_head-method and the cell-renderer
+    (see get_cell_renderer) used by the RowRenderer to render the html-code of the cells of this column
     """
     
     # Set as object of Column, so the Width is accessible as a Property of Column (For writing Column.Width.SMALL in the definition of the grid)
     Width = Width
-    #Filter = Filter
+    Filter = Filter
         
     # ID-Counter for each column
     nr_counter = 0
+    
+    # If True, the column sends the rendered html instead of the raw value when the grid renders json
+    json_html = False
+    
+    # If False, the column is left out when the data is exported
+    exportable = True
 
-    def __init__(self, label=None, db_field=None, obj_field=None, visible=True, sortable=True, nullable=False, filterable=False, show_filter_if_hidden=True, styles=None, classes=None, widthtype=Width.NORMAL):
+    def __init__(self, label=None, db_field=None, obj_field=None, visible=True, sortable=True, nullable=False, filterable=False, show_filter_if_hidden=True, styles=None, classes=None, widthtype=Width.NORMAL, facet=False, aggregate=None):
         """
         Init a new column-instance
         @param label 
@@ -54,13 +73,15 @@ class Column(object):
         @param styles This may be a dictionary with additional styles the column should have
         @param classes Additional CSS-Classes for the column
         @param widthtype Assign a width to the column. 
+        @param facet Offer the distinct values of the column with their counts in the filter-form (see facets.py)
+        @param aggregate The aggregate (sum, avg, min, max or count) of all filtered rows displayed in the footer
         """
         # Assign a unique nr
         self.__nr = Column.nr_counter
         Column.nr_counter += 1
         
-        # Get a resource-handler
-        self.resouces = GridResourceHandler(project_settings.STATIC_URL)
+        # Get the shared resource-handler
+        self.resources = get_resource_handler()
         
         # Store options
         self.__label = label
@@ -74,109 +95,260 @@ class Column(object):
         self.__styles = styles if styles != None else {}
         self.__classes = classes if classes != None else []
         self.__widthtype = widthtype
+        self.__facet = facet
+        self.__aggregate = aggregate
 
         # placeholder        
         self._filter = None
+        self._formatter = None
         self.__column_id = None
-        self.__settings = None
-        self.__grid_id = None
+        
+        # The rendered static parts of the header and the rendered filter-widget (without facet), if it is static
+        self.__head_cache = {}
+        self.__filter_widget = None
         
         
-    def initialize(self, request, column_id, grid_id, settings):
+    def initialize(self, column_id):
         """
-        This will called once the grid is initialized. This method will init some values, that couldnt be initialized
-        before the id is fixed, which can only be obtained once the grid initialized all columns
-        @param reqeust The current request
+        This will be called once the grid-class is defined. This method will init some values, that couldnt be initialized
+        before the id is fixed, which can only be obtained once the grid collected all columns
         @param column_id  The id the grid assigned for this column
-        @param grid_id The id of the grid
-        @param settings Dictionary containing some constant setup-variables (like template-pathes, image-basefolder, ....)
         """
-        self.__request = request
         self.__column_id = column_id
-        self.__grid_id = grid_id
-        self.__settings = settings
         self.__label = column_id if self.__label == None else self.__label
         self.__db_field = column_id if self.__db_field == None else self.__db_field
         self.__obj_field = self.__obj_field if self.__obj_field != None else self.__db_field
+        self.__obj_path = self.__obj_field.split('.')
+        self.__lookup = self.__db_field.replace('.', '__')
         
         # make filter nullable, if column is nullable
-        # TODO: Filter
-        #if self.__nullable:
-            #self._filter.make_nullable()
+        if self._filter and self.__nullable:
+            self._filter.make_nullable()
+        
+        self._formatter = self._compile_formatter()
             
-    def prepare_for_render(self, queryset, data):
-        """ This will prepare the queryset with the data given and adapt this column to 
-        the given data.
-        @param queryset The query-set the grid is based on
-        @param data The data given for this column (Like filtering, sorting, ...)
+    def bind(self, request, grid_id, settings):
+        """
+        This will be called for each request the grid is rendered for. The column itself is shared by all
+        requests and therefore never changed. Instead the request-specific state is stored in a BoundColumn.
+        @param reqeust The current request
+        @param grid_id The id of the grid
+        @param settings Dictionary containing some constant setup-variables (like template-pathes, image-basefolder, ....)
+        @return BoundColumn The state of this column for the request
         """
-        pass
+        return BoundColumn(self, request, grid_id, settings)
+        
+    def get_id(self):
+        """ Return the id of this column """
+        return self.__column_id
+    
+    def get_label(self):
+        """ Return the label of this column. If the label is callable, it will be called """
+        return self.__label() if callable(self.__label) else self.__label
+    
+    def get_nr(self):
+        """ Return the unique number of this column, which defines the order of the columns """
+        return self.__nr
+    
+    def get_db_field(self):
+        """ Return the field (maybe with `.` as separator) the data of this column is stored in """
+        return self.__db_field
     
+    def get_lookup(self):
+        """ Return the db_field in the format used for lookups in querysets (`__` instead of `.`) """
+        return self.__lookup
     
-    def render_head(self, request):
+    def get_obj_field(self):
+        """ Return the field (maybe with `.` as separator) used to access the data on the object """
+        return self.__obj_field
+    
+    def get_value(self, row):
+        """
+        Return the value of this column for the given row by following the obj_field. 
+        @param row The object (or dict) of the row
+        @return The value or None, if an object on the way is None
         """
-        This will render the head-cell of the columnwidget. 
-        @param The request that is issued the render
-        @param model The model that contains the data. This neccessary to render the sorting and filters
+        value = row
+        for name in self.__obj_path:
+            # Not compared with ==, which would call the __eq__ of each model-instance
+            if value is None:
+                return None
+            value = value[name] if isinstance(value, dict) else getattr(value, name)
+        return value
+    
+    def is_visible(self):
+        return self.__visible
+    
+    def is_sortable(self):
+        return self.__sortable
+    
+    def is_nullable(self):
+        return self.__nullable
+    
+    def is_filterable(self):
+        return self._filter != None
+    
+    def get_facet(self):
+        """ Return the kind of facet of the column. False, if the column has none """
+        return self.__facet if self._filter else False
+    
+    def format_facet(self, value):
+        """
+        Format a distinct value of the column for its facet
+        @param value The value as returned by the database
+        @return dict with the value and mode of the filter and the label displayed
+        """
+        if value == None:
+            return {'value': u"", 'label': u"(leer)", 'mode': Filter.ISNULL.get_id()}
+        return {'value': unicode(value), 'label': unicode(value), 'mode': Filter.IS.get_id()}
+    
+    def get_aggregate(self):
+        """ Return the aggregate of the column or None """
+        return self.__aggregate
+    
+    def render_aggregate(self, value):
+        """
+        Render the aggregated value of the column, which is displayed in the footer
+        @param value The value computed by the database
+        @return html-string
+        """
+        return escape(unicode(value)) if value != None else u""
+    
+    def show_filter_if_hidden(self):
+        return self.__show_filter_if_hidden
+    
+    def icon(self, name, deactivated=False):
+        """ Return the url of the icon with the given name """
+        return self.resources.icon(name, deactivated)
+    
+    def compile_filter(self, mode, values):
+        """
+        Compile a filter sent by the client into a Q-object for the queryset
+        @param mode The id of the mode
+        @param values The values of the filter
+        @return Q
+        @throws InvalidFilterException If the column is not filterable or the filter is invalid
+        """
+        if not self._filter:
+            raise InvalidFilterException(u"Spalte kann nicht gefiltert werden")
+        return self._filter.compile(self.__lookup, mode, values)
+    
+    def render_head(self, state):
+        """
+        This will render the head-cell of the columnwidget. The template is only rendered once for each grid,
+        template, language and label. The result is split at the markers of the dynamic parts (HEAD_PARTS), 
+        which are filled in for each request. If the setting cache_column_heads is disabled, the template is 
+        rendered for each request.
+        @param state The BoundColumn holding the request, settings, sorting and filters of this column
         @return Safe-marked html-string containing the code for the head
         """
+        label = self.get_label()
+        if not state.settings['cache_column_heads']:
+            return mark_safe(self._render_head_template(state, label, self._render_head_parts(state)))
         
-        # prepare the sorting
-        if self.__sortable:
-            sorted_ascending = model.get_sorting(self.get_id())
-            sorted = {
-                'current': {None: 0, True: 1, False: -1}.get(sorted_ascending),
-                'next': {None: 1, True: -1, False: 1}.get(sorted_ascending)
-            }
-        else:
-            sorted = None
-
-        # Prepare the filter
-        if self._filter:
-            filter_active = model.get_filter(self.get_id()) #Format: {nr, id, value, mode, success}
-            filter_widget = self._filter.render()
-            
-            for f in filter_active:
-                f['mode'] = mark_safe(Filter.get_mode_description(f['mode']))
-        else:
-            filter_active = None
-            filter_widget = None
-        
+        key = (state.grid_id, state.settings['column_head_template'], state.settings['show_controls'], get_language(), label)
+        parts = self.__head_cache.get(key)
+        if parts == None:
+            markers = dict([(name, mark_safe(_HEAD_MARKER % name)) for name in HEAD_PARTS])
+            if not self._filter:
+                markers['filterwidget'] = None
+            parts = _HEAD_MARKER_RE.split(self._render_head_template(state, label, markers))
+            self.__head_cache[key] = parts
         
-        # Start the rendering   
+        # Every second part is the name of a dynamic part
+        dynamic = self._render_head_parts(state)
+        return mark_safe(u"".join([dynamic[part] if nr % 2 else part for nr, part in enumerate(parts)]))
+    
+    def _render_head_template(self, state, label, parts):
+        """
+        Render the template of the head-cell
+        @param state The BoundColumn
+        @param label The label of the column
+        @param parts dict with the rendered dynamic parts (or their markers)
+        @return unicode
+        """
         context = {
             # Ids
-            'grid_id' : self.__grid_id,
+            'grid_id' : state.grid_id,
             'column_id' : self.get_id(),
             
             # Basic things
-            'label' : self.__label() if callable(self.__label) else self.__label,
+            'label' : label,
             'styles': self.__styles,
             'classes': self.__classes,
             'visible': self.__visible,
-            
-            # Extras (Sorting, filter, ...)
-            'sorted' : sorted,
-            'filter': filter_active,
-            'filterwidget': filter_widget,
-            'show_controls': self.__settings['show_controls'],
+            'sortable': self.__sortable,
+            'show_controls': state.settings['show_controls'],
         }
+        context.update(parts)
+        return render_to_string(state.settings['column_head_template'], context, RequestContext(state.request))
+    
+    def _render_head_parts(self, state):
+        """
+        Render the parts of the header, which depend on the request: The icon of the sort-direction, the active 
+        filters, the filter-widget and the facet. The templates of the filters and the facet are only rendered,
+        if there are any.
+        @param state The BoundColumn
+        @return dict name: safe-marked html-string
+        """
+        parts = dict.fromkeys(HEAD_PARTS, u"")
+        if self.__sortable and state.sorting != None:
+            direction, icon = ('ascending', 'sort_asc') if state.sorting else ('descending', 'sort_desc')
+            parts['sort_icon'] = mark_safe(u'<img class="grid_sort_icon %s" src="%s/img/grid/%s.png" alt="%s"/>' % (
+                direction, project_settings.STATIC_URL, icon, direction))
+        if not self._filter:
+            return parts
         
-        return mark_safe(render_to_string(self.__settings['column_head_template'], context, RequestContext(request)))
+        # Format of the filters: {nr, column_id, value, mode, error}
+        context = {'grid_id': state.grid_id, 'column_id': self.get_id(), 'STATIC_URL': project_settings.STATIC_URL}
+        if state.filters:
+            parts['active_filters'] = mark_safe(render_to_string(state.settings['column_head_filters_template'], 
+                                                                 dict(context, filter=state.filters)))
+        if state.facet:
+            parts['facets'] = mark_safe(render_to_string(state.settings['column_head_facets_template'], 
+                                                         dict(context, facet=state.facet)))
+            parts['filterwidget'] = self._filter.render(state.facet)
+        elif not state.settings['cache_column_heads'] or not self._filter.is_static():
+            parts['filterwidget'] = self._filter.render()
+        else:
+            if self.__filter_widget == None:
+                self.__filter_widget = self._filter.render()
+            parts['filterwidget'] = self.__filter_widget
+        return parts
     
-    def render_content(self, request, row):
+    def get_cell_renderer(self):
         """
-        This will render the content-coll of the column for a specified object/data-set
-        @param row The row that was supplied by the model
-        @return Safe-marked html-string containing the code for the cell
-        """        
-        context = {
-            'content' : mark_safe(self._render_data(row))
-        }
-
-        return mark_safe(render_to_string(self.__settings['column_content_template'], context, RequestContext(request)))
-            
-   
+        Return a callable, which gets the object of a row and returns the html-code of the content of 
+        the cell. This is used by the RowRenderer to render all rows at once.
+        """
+        return self._render_data
+    
+    def _compile_formatter(self):
+        """
+        Compile the formatter of the values of this column (see formatters.py). It is called once, when the 
+        schema of the grid is built. By default columns have no formatter and render their cells with _render_data.
+        @return function value -> unicode or None
+        """
+        return None
+    
+    def get_formatter(self):
+        """
+        Return the compiled formatter, if the content of the cells is just the formatted value, otherwise None.
+        The RowRenderer uses it to format the values of a page column by column.
+        """
+        return None
+    
+    def get_json_renderer(self):
+        """
+        Return a callable, which gets the object of a row and returns the value sent to the browser
+        when the grid renders json. By default this is the raw value (or its text, if it can't be sent as json,
+        like a related object), if json_html is set the rendered html-code.
+        """
+        if self.json_html:
+            return self._render_data
+        get_value = self.get_value
+        return lambda row: json_value(get_value(row))
+    
     def _render_data(self, data):
         """
         This function must be overwritten by each child and should return a string containing the html-code to render as 
@@ -190,21 +362,459 @@ class Column(object):
         
 
 
+class BoundColumn(object):
+    """
+    The state of a column for a single request. The column-definitions are class-attributes of the grid and 
+    therefore shared by all requests (and threads). Everything that depends on the request is stored
+    in this lightweight object instead. All other attributes are looked up on the column itself.
+    """
+    __slots__ = ('column', 'request', 'grid_id', 'settings', 'sorting', 'filters', 'search_terms', 'facet')
+    
+    def __init__(self, column, request, grid_id, settings):
+        """
+        @param column The (shared) column-definition
+        @param request The current request
+        @param grid_id The id of the grid
+        @param settings The settings of the grid
+        """
+        self.column = column
+        self.request = request
+        self.grid_id = grid_id
+        self.settings = settings
+        
+        # None if unsorted, otherwise True for ascending and False for descending
+        self.sorting = None
+        self.filters = []
+        
+        # The terms of the quick-search, which are highlighted in the cells
+        self.search_terms = None
+        
+        # The distinct values of the column with their counts, if the column has a facet
+        self.facet = None
+        
+    def __getattr__(self, name):
+        return getattr(self.column, name)
+    
+    def render_head(self):
+        return self.column.render_head(self)
+    
+    def get_cell_renderer(self):
+        renderer = self.column.get_cell_renderer()
+        return highlight(renderer, self.search_terms) if self.search_terms else renderer
+    
+    def get_formatter(self):
+        # The searched terms are highlighted by the cell-renderer
+        return None if self.search_terms else self.column.get_formatter()
+        
+
+
 # ==========================================================================================================
 # ==========================================================================================================
 #    Special instances of the Column which must be used instead of the parent-column
 
+
 class TextColumn(Column):  
     """ Column for displaying simple text-values """
     
+    class Filter(Filter):
+        modes = [Filter.CONTAINS, Filter.IS]
     
     def __init__(self, *args, **kw):
         super(TextColumn, self).__init__(*args, **kw)        
-        #self._filter = TextColumn.Filter()
+        if kw.get('filterable'):
+            self._filter = TextColumn.Filter()
         
     def _render_data(self, row):
         """ Render the content of the textColumn """
-        value = row.get_value(self.get_id())
+        value = self.get_value(row)
         return value if value != None else ""
     
-   
\ No newline at end of file
+ 
+class ChoiceColumn(TextColumn):
+    """ A choice-column is basicly the same as a textcolumn, but the filter will only
+    offer a selectbox to choose from. If no choices are given, the distinct values of the
+    column are taken from its facet """
+    
+    class Filter(Filter):
+        modes = [Filter.IS]
+        
+        def __init__(self, choices):
+            self.__choices = choices
+        
+        def is_static(self):
+            # Callable choices may change with each request
+            return not callable(self.__choices)
+        
+        def _render_input(self, facet=None):
+            # Get the choices. If callable call, otherwise just use (and iterate over them)
+            l = self.__choices
+            if l == None:
+                choices = [f['value'] for f in facet or [] if f['mode'] == Filter.IS]
+            else:
+                choices = l() if callable(l) else l
+            
+            options = u"".join([u"<option value='%s'>%s</option>" % (escape(v), escape(v)) for v in choices])
+            input = u"<select class='grid_filter_form_input'>%s</select>" % options    
+            return input
+    
+    def __init__(self, choices=None, *args, **kw):
+        if choices == None:
+            kw['facet'] = True
+        super(ChoiceColumn, self).__init__(*args, **kw)
+        self._filter = ChoiceColumn.Filter(choices)
+    
+        
+    
+class BooleanColumn(Column):
+    """ Column for displaying a true/false-column """
+    json_html = True
+    
+    class Filter(Filter):
+        modes = [Filter.IS]
+        
+        def _render_input(self, facet=None):
+            return u"""<select class='grid_filter_form_input'>
+                        <option value='true'>Ja</option>
+                        <option value='false'>Nein</option>
+                    </select>"""
+        
+        def convert(self, mode, values):
+            """ Convert the only value we have to a pyton-boolean """
+            return [{'mode': mode, 'value': (values[0] in ['true', '1', 't', 'True'])}]
+            
+    
+    """ Column for displaying a boolean value """
+    def __init__(self, *args, **kw):
+        super(BooleanColumn, self).__init__(widthtype=Width.ICON, *args, **kw)
+        self._filter = BooleanColumn.Filter()
+    
+    def format_facet(self, value):
+        if value == None:
+            return super(BooleanColumn, self).format_facet(value)
+        return {'value': u"true" if value else u"false", 'label': u"Ja" if value else u"Nein", 'mode': Filter.IS.get_id()}
+        
+    def _render_data(self, row):
+        value = self.get_value(row)
+        return u"<img class='column_icon' src='%s'/>" % self.icon("checked" if value else "unchecked")
+        
+       
+class NumberColumn(Column):
+    """ Column for displaying a number """
+    json_html = True
+    
+    class Filter(Filter):
+        modes = [Filter.IS, Filter.LESS, Filter.LESSEQUAL, Filter.GREATER, Filter.GREATEREQUAL, Filter.BETWEEN]
+        
+        def __init__(self, floating):
+            self.__floating = floating
+        
+        def convert(self, mode, values):
+            """ If mode is between (-=) split and return two filters """
+            try:
+                # Convert to float or int. The values may also be numbers (like preset filters or json)
+                conversion_method = float if self.__floating else int
+                converted = [conversion_method(unicode(x).replace(',','.')) for x in values]
+            except ValueError:
+                raise InvalidFilterException(u"Fehler in Zahl")
+            
+            # return the filter
+            if mode == Filter.BETWEEN:
+                return [{'mode': Filter.GREATEREQUAL.get_id(), 'value': converted[0]}, {'mode': Filter.LESSEQUAL.get_id(), 'value': converted[1]}]
+                
+            else:
+                return [{'mode': mode, 'value': converted[0]}]
+            
+        def _get_regex(self):
+            if self.__floating:
+                return "^-?(?:\d+|\d*[\.,]\d+)$"
+            else:
+                return "^\s*-?\d+\s*$"
+                
+    
+    def __init__(self, pre_digits=None, digits=None, decimal_separator=u".", thousand_separator=None, localize=False, *args, **kw):
+        """ 
+        @param pre_digits The minimal amount of digits to print before the ,
+        @param digits The amount of digits to print after the ,
+        @param decimal_separator The separator of the digits
+        @param thousand_separator The separator of the thousands or None
+        @param localize Use the separators of the active language instead (see formatters.locale_separators)
+        """
+        super(NumberColumn, self).__init__(*args, **kw)
+        self._filter = NumberColumn.Filter(digits != None)
+        self.__digits = digits
+        self.__localize = localize
+        self._format_options = {
+            'pre_digits': pre_digits,
+            'digits': digits,
+            'decimal_separator': decimal_separator,
+            'thousand_separator': thousand_separator,
+        }
+        self.__average_formatter = None
+        
+        # The localized formatters of each language as tuple (formatter, average-formatter)
+        self.__localized = {}
+        
+    def __compile(self, separators=None):
+        """
+        Compile the formatter of the values and of the average
+        @param separators Tuple (decimal_separator, thousand_separator) replacing the ones of the column or None
+        @return tuple (formatter, average-formatter or None)
+        """
+        options = dict(self._format_options)
+        if separators != None:
+            options['decimal_separator'], options['thousand_separator'] = separators
+        
+        # The average of whole numbers is usually fractional
+        average = None if self.__digits else compile_number(**dict(options, pre_digits=None, digits=2))
+        return compile_number(**options), average
+        
+    def _compile_formatter(self):
+        # The separators of localized columns depend on the language of the request, see __get_formatters
+        if self.__localize:
+            return None
+        formatter, self.__average_formatter = self.__compile()
+        return formatter
+    
+    def __get_formatters(self):
+        """ Return the formatter and the average-formatter. Localized ones are compiled once for each language """
+        if not self.__localize:
+            return self._formatter, self.__average_formatter
+        language = get_language()
+        formatters = self.__localized.get(language)
+        if formatters == None:
+            formatters = self.__localized[language] = self.__compile(locale_separators())
+        return formatters
+    
+    def get_formatter(self):
+        # A subclass overriding _render_data renders its cells itself
+        return self.__get_formatters()[0] if type(self)._render_data.im_func is NumberColumn._render_data.im_func else None
+        
+    def _render_data(self, row):
+        return self._format(self.get_value(row))
+    
+    def render_aggregate(self, value):
+        # The count is an amount of rows, so it isn't formatted like the values (like with a currency-symbol)
+        if self.get_aggregate() == 'count':
+            return super(NumberColumn, self).render_aggregate(value)
+        formatter, average_formatter = self.__get_formatters()
+        if self.get_aggregate() == 'avg' and average_formatter != None:
+            return average_formatter(value)
+        return formatter(value)
+    
+    def _format(self, value):
+        """ Format a value of the column """
+        return self.__get_formatters()[0](value)
+        
+            
+class CurrencyColumn(NumberColumn):
+    """ Column for displaying a currency (by default german) """
+    def __init__(self, symbol=None, decimal_separator=u",", thousand_separator=u".", *args, **kw):
+        """
+        @param symbol The currency-symbol appended to the values (like €)
+        """
+        super(CurrencyColumn, self).__init__(digits=2, decimal_separator=decimal_separator, thousand_separator=thousand_separator, 
+                                             *args, **kw)
+        self._format_options.update(width=20, symbol=symbol)
+       
+       
+class DateColumn(Column):
+    """ Column for displaying a date/time. If the time-parameter is false, 
+    this will only print the date, otherwise time and date """
+    json_html = True
+    
+    class Filter(Filter):
+        modes = [Filter.IS, Filter.LESS, Filter.LESSEQUAL, Filter.GREATER, Filter.GREATEREQUAL, Filter.BETWEEN]
+        
+        regex = "^(((?P<day>\d{1,2})\.)?((?P<month>\d{1,2})\.))?(?P<year>\d{4})$"
+        
+        def extract_date(self, value):
+            """ Extract the date from the value. Return-value is a dict with ints or None,
+            if the value is not set
+            """
+            match = re.match(self.regex, unicode(value).strip())
+            if not match:
+                raise InvalidFilterException(u"Kein g&uuml;ltiges Datum!")
+            
+            result = match.groupdict()
+            return {'year': int(result['year']),
+                    'month': int(result['month']) if result['month'] else None,
+                    'day': int(result['day']) if result['day'] else None}
+        
+        def generate_range(self, year, month, day):
+            """ 
+            Return the range of the given (partial) date as tuple (start, end). The range is half-open, so
+            the end is the first date after the range. For a missing day it spans the month, for
+            a missing month the year.
+            """
+            try:
+                if day != None:
+                    start = date(year, month, day)
+                    return start, start + timedelta(days=1)
+                if month != None:
+                    start = date(year, month, 1)
+                    return start, date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+                return date(year, 1, 1), date(year + 1, 1, 1)
+            except ValueError:
+                raise InvalidFilterException(u"Kein g&uuml;ltiges Datum!")
+            
+        
+        def convert(self, mode, values):
+            """ Convert the dates to python-objects. Each filter is converted to compare with the
+            bounds of the range of the entered date, so no date-functions are needed in the database
+            and the index of the field can be used """
+            start, end = self.generate_range(**self.extract_date(values[0]))
+            
+            if mode == Filter.BETWEEN:
+                upper_start, upper_end = self.generate_range(**self.extract_date(values[1]))
+                return [{'mode': Filter.GREATEREQUAL.get_id(), 'value': start},
+                        {'mode': Filter.LESS.get_id(), 'value': upper_end}]
+            elif mode == Filter.IS:
+                return [{'mode': Filter.GREATEREQUAL.get_id(), 'value': start},
+                        {'mode': Filter.LESS.get_id(), 'value': end}]
+            elif mode == Filter.LESS:
+                return [{'mode': Filter.LESS.get_id(), 'value': start}]
+            elif mode == Filter.LESSEQUAL:
+                return [{'mode': Filter.LESS.get_id(), 'value': end}]
+            elif mode == Filter.GREATER:
+                return [{'mode': Filter.GREATEREQUAL.get_id(), 'value': end}]
+            else:
+                return [{'mode': Filter.GREATEREQUAL.get_id(), 'value': start}]
+        
+        def _get_regex(self):
+            """ Return the regex for the date. This consists of multiple regexes. The first
+            is a normal date/month/year format, where the the day/montth may consist of 1/2 parts
+            and the year of 4 parts.
+            The second just matches a mm.yyyy part and the last just years """
+            return "^((\d{1,2}\.)?(\d{1,2}\.))?(\d{4})$"
+            
+    
+    def __init__(self, *args, **kw):
+        """ 
+        The facet of a date-column is the bucket (year or month) the dates are grouped by. The keyword date_format
+        sets the format of the dates in the syntax of strftime (by default german)
+        """
+        self.__date_format = kw.pop('date_format', "%d.%m.%Y")
+        super(DateColumn, self).__init__(*args, **kw)
+        self._filter = DateColumn.Filter()
+    
+    def format_facet(self, value):
+        if value == None:
+            return super(DateColumn, self).format_facet(value)
+        bucket = format_date_bucket(value, self.get_facet())
+        return {'value': bucket, 'label': bucket, 'mode': Filter.IS.get_id()}
+        
+    def _compile_formatter(self):
+        return compile_date(self.__date_format)
+    
+    def get_formatter(self):
+        # A subclass overriding _render_data renders its cells itself
+        return self._formatter if type(self)._render_data.im_func is DateColumn._render_data.im_func else None
+        
+    def _render_data(self, row):
+        """ Render the data to be printed as a german-style date """
+        return self._formatter(self.get_value(row))
+    
+    def render_aggregate(self, value):
+        return self._format(value) if self.get_aggregate() in ('min', 'max') else super(DateColumn, self).render_aggregate(value)
+    
+    def _format(self, value):
+        return self._formatter(value)
+    
+    
+class FilterColumn(Column):
+    """ Column that is just used for filtering. It is invisible by default """
+    
+    class Filter(Filter):
+        modes = [Filter.IS]
+    
+    def __init__(self, show=False, *args, **kw):
+        super(FilterColumn, self).__init__(show_filter_if_hidden=show, visible=False, *args, **kw)
+        self._filter = FilterColumn.Filter()
+        
+   
+class ActionColumn(Column):
+    """ Column for specifing actions on the grid (like editing, deleting...)
+    These Actions can take an icon or a text 
+    """
+    json_html = True
+    exportable = False
+    
+    def __init__(self, url, icon, icon_disabled=None, classes=None):
+        super(ActionColumn, self).__init__(sortable=False,
+                                           label='',
+                                           classes=classes,
+                                           widthtype=Width.ICON)
+        self._filter = None
+        self.__url = url
+        self.__icon = icon
+        self.__icon_disabled = icon_disabled
+        self.__nullable = (icon_disabled != None)
+        
+    def _render_data(self, row):
+        """ Render the action-button. This will be an a-tag with the url specified in
+        the ctor. if the url is callable, the function will be called and one parameter,
+        the gridrow-object, will be supplied """
+        try:
+            url = (self.__url)(row) if callable(self.__url) else self.__url
+            click = self._onclick()
+            icon = self.__icon() if callable(self.__icon) else self.__icon
+            return mark_safe(u"""<a href="%s" onclick="%s">
+                                  <img class="grid_icon" src="%s"/>
+                                </a>""" % (url, click, icon))
+        except Exception:
+            if self.__nullable:
+                return mark_safe(u"""<img class='grid_icon deactivated' src="%s" />""" % self.__icon_disabled)            
+            else:
+                raise
+            
+        
+        
+    def _onclick(self):
+        """ This can return a string, that will be supplied as the onclick-value
+        of the a-tag. By default this returns nothing """
+        return ""
+    
+    
+class SelectColumn(Column):
+    """ 
+    Column with a checkbox for selecting rows, on which the bulk-actions of the grid are run (see actions.py).
+    The rows matching the filters can also be selected at once below the grid, including the ones on other pages
+    """
+    json_html = True
+    exportable = False
+    
+    def __init__(self, classes=None):
+        super(SelectColumn, self).__init__(sortable=False,
+                                           label='',
+                                           classes=classes,
+                                           widthtype=Width.ICON)
+        
+    def _render_data(self, row):
+        return mark_safe(u"<input type='checkbox' class='grid_select' value='%s' />" % escape(row.pk))
+    
+    
+class EditColumn(ActionColumn):
+    def __init__(self, url, *args, **kw):
+        super(EditColumn, self).__init__(*args,
+                                         url=url,
+                                         icon=lambda: self.icon('column_edit'),
+                                         **kw)
+
+class DeleteColumn(ActionColumn):
+    def __init__(self, url, *args, **kw):
+        super(DeleteColumn, self).__init__(*args,
+                                           url=url,
+                                           icon=lambda: self.icon('column_delete'),
+                                           **kw)
+        
+    
+    def _onclick(self):
+        """override the onclick of the link, to enter a confirmation-box.  """
+        return u"""return hsf.dialogs.confirm_delete(this);""";
+           
+class InfoColumn(ActionColumn):
+    def __init__(self, url, *args, **kw):
+        super(InfoColumn, self).__init__(*args,
+                                         url=url,
+                                         icon=lambda: self.icon('column_info'),
+                                         **kw)
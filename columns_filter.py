@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the filters of the columns. A filter renders the widget used to enter the filter in
+the browser and compiles the filters sent by the client into lookups for the queryset.
+"""
+
+# Lib-Imports
+import logging
+
+# Django imports
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# Grid-Imports
+from exceptions import InvalidFilterException
+
+
+logger = logging.getLogger(__name__)
+
+
+class Mode(object):
+    """
+    A mode of a filter (like `=` or `<`). Each mode knows the lookup it is compiled to and the amount of
+    inputs it needs. A mode compares equal to its id, so it can be compared with the mode sent by the client.
+    """
+
+    def __init__(self, id, description, inputs=1, lookup=None):
+        """
+        @param id The id of the mode, which is sent by the client
+        @param description The text displayed for the mode
+        @param inputs The amount of values the mode needs
+        @param lookup The lookup used in the queryset (like `exact` or `lt`). None, if the filter must convert it
+        """
+        self.__id = id
+        self.__description = description
+        self.__inputs = inputs
+        self.__lookup = lookup
+
+    def get_id(self):
+        return self.__id
+
+    def get_description(self):
+        return self.__description
+
+    def get_inputs(self):
+        return self.__inputs
+
+    def get_lookup(self):
+        return self.__lookup
+
+    def __eq__(self, other):
+        other_id = other.get_id() if isinstance(other, Mode) else other
+        return self.__id == other_id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.__id)
+
+
+class Filter(object):
+    """
+    Base-class for the filters of the columns. The modes offered by a filter are defined in `modes`.
+    Subclasses may convert the values sent by the client (convert), define a regex the input is checked
+    with in the browser (_get_regex) or render their own input (_render_input).
+    """
+
+    # All modes a filter may offer
+    IS = Mode("=", u"ist gleich", 1, 'exact')
+    LESS = Mode("<", u"kleiner", 1, 'lt')
+    LESSEQUAL = Mode("<=", u"kleiner gleich", 1, 'lte')
+    GREATER = Mode(">", u"gr&ouml;&szlig;er", 1, 'gt')
+    GREATEREQUAL = Mode(">=", u"gr&ouml;&szlig;er gleich", 1, 'gte')
+    BETWEEN = Mode("-=", u"zwischen", 2)
+    CONTAINS = Mode("~", u"enth&auml;lt", 1, 'icontains')
+    ISNULL = Mode("0", u"ist leer", 0, 'isnull')
+    ALL_MODES = [IS, LESS, LESSEQUAL, GREATER, GREATEREQUAL, BETWEEN, CONTAINS, ISNULL]
+
+    # The modes offered by this filter
+    modes = [IS]
+
+    # If nullable, the filter also offers the mode ISNULL
+    nullable = False
+
+    @classmethod
+    def get_mode(cls, mode_id):
+        """ Return the mode with the given id or None """
+        for mode in cls.ALL_MODES:
+            if mode == mode_id:
+                return mode
+        return None
+
+    @classmethod
+    def get_mode_description(cls, mode_id):
+        """
+        Return the description of the mode with the given id as safe-marked html. Unknown ids are sent
+        by the client, so they are escaped
+        """
+        mode = cls.get_mode(mode_id)
+        return mark_safe(mode.get_description()) if mode else escape(mode_id)
+
+    def make_nullable(self):
+        """ Offer the mode ISNULL in addition to the modes of the filter """
+        self.nullable = True
+
+    def get_modes(self):
+        return self.modes + [Filter.ISNULL] if self.nullable else self.modes
+
+    def is_static(self):
+        """ Return True, if the widget (without facet) is the same for each request, so it may be cached """
+        return True
+
+    def convert(self, mode, values):
+        """
+        Convert the values sent by the client. The result is a list of dicts with the keys mode and value.
+        All of them must match for a row to pass the filter. By default the first value is used as is.
+        @param mode The id of the mode
+        @param values The values entered in the browser
+        @return list of dicts
+        @throws InvalidFilterException If the values are invalid
+        """
+        return [{'mode': mode, 'value': values[0]}]
+
+    def compile(self, lookup, mode_id, values):
+        """
+        Compile the filter into a Q-object, which can be applied to the queryset
+        @param lookup The lookup of the filtered column
+        @param mode_id The id of the mode sent by the client
+        @param values The values sent by the client
+        @return Q
+        @throws InvalidFilterException If the mode or the values are invalid
+        """
+        mode = self.get_mode(mode_id)
+        if mode == None or mode not in self.get_modes():
+            raise InvalidFilterException(u"Ung&uuml;ltiger Filter")
+        if mode == Filter.ISNULL:
+            return Q(**{"%s__isnull" % lookup: True})
+        if len(values) < mode.get_inputs():
+            raise InvalidFilterException(u"Fehlender Wert")
+
+        condition = Q()
+        for converted in self.convert(mode_id, values):
+            converted_mode = self.get_mode(converted['mode'])
+            condition &= Q(**{"%s__%s" % (lookup, converted_mode.get_lookup()): converted['value']})
+        return condition
+
+    def _get_regex(self):
+        """ Return the regex, the input is checked with in the browser. By default no check is done """
+        return ""
+
+    def _render_input(self, facet=None):
+        """
+        Render the inputs of the filter. By default a text-input for each value is rendered
+        @param facet The distinct values of the column with their counts or None
+        """
+        inputs = max([m.get_inputs() for m in self.get_modes()] + [1])
+        return u"".join([u"<input type='text' class='grid_filter_form_input' />"] * inputs)
+
+    def render(self, facet=None):
+        """
+        Render the widget of the filter, which is displayed in the header of the column
+        @param facet The distinct values of the column with their counts or None
+        @return Safe-marked html-string
+        """
+        modes = self.get_modes()
+        regex = u"<input type='hidden' class='grid_filter_form_regex' value='%s' />" % escape(self._get_regex())
+        if len(modes) == 1:
+            mode = u"<input type='hidden' class='grid_filter_form_mode' value='%s' data-inputs='%d' />" % (
+                escape(modes[0].get_id()), modes[0].get_inputs())
+        else:
+            options = u"".join([u"<option value='%s' data-inputs='%d'>%s</option>" % (escape(m.get_id()), m.get_inputs(), m.get_description())
+                                for m in modes])
+            mode = u"<select class='grid_filter_form_mode'>%s</select>" % options
+        return mark_safe(regex + mode + self._render_input(facet))
+
+
+def is_indexed(model, lookup):
+    """
+    Check if the field the lookup points to has a database-index. The lookup is followed along the
+    relations of the model.
+    @param model The model the lookup starts at
+    @param lookup The lookup (with `__` as separator)
+    @return bool True if indexed. None if the lookup couldn't be resolved
+    """
+    names = lookup.split('__')
+    for i, name in enumerate(names):
+        try:
+            field, related_model, direct, m2m = model._meta.get_field_by_name(name)
+        except FieldDoesNotExist:
+            return None
+        if not direct or m2m:
+            return None
+        if i < len(names) - 1:
+            if getattr(field, 'rel', None) == None:
+                return None
+            model = field.rel.to
+
+    if field.primary_key or field.unique or field.db_index:
+        return True
+    # The field may also be the first field of a combined index
+    return any(fields[0] == field.name for fields in getattr(model._meta, 'index_together', []))
+
+
+def find_unindexed(model, columns):
+    """
+    Return the ids of the filterable columns, whose field has no database-index. Filtering these
+    columns results in a scan of the entire table. A warning is logged for each of them.
+    @param model The model of the queryset
+    @param columns The columns of the grid
+    @return list of column-ids
+    """
+    unindexed = []
+    for column in columns:
+        if column.is_filterable() and is_indexed(model, column.get_lookup()) == False:
+            unindexed.append(column.get_id())
+            logger.warning("The filtered column %s (%s.%s) has no database-index", column.get_id(),
+                           model._meta.object_name, column.get_lookup())
+    return unindexed
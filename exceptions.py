@@ -14,3 +14,13 @@ class GridConfigurationException(GridException):
     """ Exception thrown, if something during the initialization/configuration of the grid 
     went wrong. """
     pass
+
+class InvalidFilterException(GridException):
+    """ Exception thrown, if the filter sent by the client is not valid. The message is displayed at 
+    the filter """
+    pass
+
+class InvalidStateException(GridException):
+    """ Exception thrown, if the encoded state sent by the client can't be decoded or the snapshot
+    of the state doesn't exist (anymore) """
+    pass
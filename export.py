@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the formats the data of a grid can be exported to. Each format writes the rows
+as a generator, so the data can be streamed to the client without keeping it in memory.
+"""
+
+# Lib-Imports
+import csv
+import datetime
+import simplejson
+import tempfile
+
+# Django imports
+from django.utils import timezone
+
+# Grid-Imports
+from exceptions import GridConfigurationException
+from serialization import json_default
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+
+class Export(object):
+    """
+    Base-class for all export-formats. An export gets the exported columns and an iterable of rows and
+    generates the content of the file piece by piece
+    """
+    content_type = None
+    extension = None
+
+    def __init__(self, columns):
+        """
+        @param columns The (bound) columns to export
+        """
+        self.columns = columns
+        self.getters = [c.get_value for c in columns]
+
+    def generate(self, rows):
+        """
+        Generate the file
+        @param rows Iterable with the objects of the rows
+        @return Generator of strings
+        """
+        raise NotImplementedError()
+
+
+class _Echo(object):
+    """ A file-like object, that just returns what is written to it. Used to let the csv-writer generate lines """
+
+    def write(self, value):
+        return value
+
+
+class CsvExport(Export):
+    """ Export the rows as csv (utf-8 encoded) with the labels as first line """
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __encode(self, value):
+        if value == None:
+            return ""
+        return unicode(value).encode('utf-8')
+
+    def generate(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow([self.__encode(c.get_label()) for c in self.columns])
+        for row in rows:
+            yield writer.writerow([self.__encode(get(row)) for get in self.getters])
+
+
+class JsonLinesExport(Export):
+    """ Export each row as a json-object (column-id: value) on a single line """
+    content_type = 'application/x-ndjson; charset=utf-8'
+    extension = 'jsonl'
+
+    def generate(self, rows):
+        ids = [c.get_id() for c in self.columns]
+        for row in rows:
+            values = dict(zip(ids, [get(row) for get in self.getters]))
+            yield simplejson.dumps(values, default=json_default) + "\n"
+
+
+class XlsxExport(Export):
+    """
+    Export the rows as excel-file. This needs the library xlsxwriter. As a xlsx-file is a zip-archive, it
+    can't be generated piece by piece. Instead the rows are written to a temporary file in the constant-memory
+    mode of xlsxwriter, which is streamed afterwards.
+    """
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    extension = 'xlsx'
+
+    # The size of the chunks the file is streamed with
+    chunk_size = 64 * 1024
+
+    def __init__(self, columns):
+        if xlsxwriter == None:
+            raise GridConfigurationException("The xlsx-export requires the library xlsxwriter")
+        super(XlsxExport, self).__init__(columns)
+
+    def __convert(self, value):
+        # Excel doesn't know timezones, so aware datetimes are written in the local time of the project
+        if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+            return timezone.localtime(value)
+        return value
+
+    def generate(self, rows):
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'default_date_format': 'dd.mm.yyyy',
+                                                    'remove_timezone': True})
+            sheet = workbook.add_worksheet()
+            sheet.write_row(0, 0, [unicode(c.get_label()) for c in self.columns])
+            for nr, row in enumerate(rows):
+                sheet.write_row(nr + 1, 0, [self.__convert(get(row)) for get in self.getters])
+            workbook.close()
+
+            output.seek(0)
+            chunk = output.read(self.chunk_size)
+            while chunk:
+                yield chunk
+                chunk = output.read(self.chunk_size)
+
+
+# All available formats by their name
+EXPORT_FORMATS = {
+    'csv': CsvExport,
+    'jsonl': JsonLinesExport,
+    'xlsx': XlsxExport,
+}
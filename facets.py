@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the facets of the grid. A facet lists the distinct values of a column together with the
+amount of rows having them (like `Ja (12)`, `Nein (3)`). The facets of each column are computed with
+a grouped query over the filtered data and offered in the filter-form of the column.
+"""
+
+# Lib-Imports
+from datetime import date, datetime
+
+# Django imports
+from django.db import connections
+from django.db.models import Count
+
+# Grid-Imports
+from cache import StateCache
+from exceptions import GridConfigurationException
+
+
+# The buckets a date-column may be faceted by and the format of their values
+DATE_BUCKETS = {
+    'year': "%Y",
+    'month': "%m.%Y",
+}
+
+
+def format_date_bucket(value, bucket):
+    """
+    Format the truncated date returned by the database (a date, datetime or string) as the value of the bucket,
+    which is accepted by the filter of the date-column (like `2011` or `02.2011`)
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = datetime.strptime(unicode(value)[:10], "%Y-%m-%d").date()
+    return value.strftime(DATE_BUCKETS[bucket])
+
+
+def _bucket_sql(queryset, column, bucket):
+    """ Return the sql truncating the date-field of the column to the bucket """
+    if bucket not in DATE_BUCKETS:
+        raise GridConfigurationException("Unknown facet %s of column %s" % (bucket, column.get_id()))
+    if '__' in column.get_lookup():
+        raise GridConfigurationException("The date-facet of column %s must be a field of the model itself" % column.get_id())
+
+    opts = queryset.model._meta
+    field = '"%s"."%s"' % (opts.db_table, opts.get_field(column.get_lookup()).column)
+    return connections[queryset.db].ops.date_trunc_sql(bucket, field)
+
+
+def compute_facets(queryset, columns):
+    """
+    Compute the facets of the columns with a grouped query for each column, which counts the rows of each
+    distinct value. Date-columns are grouped by their bucket (year or month). Grouping by all columns at
+    once would return the product of their distinct values, so each column is grouped on its own.
+    @param queryset The filtered queryset
+    @param columns The (bound) columns having a facet
+    @return dict column-id: list of dicts {value, label, mode, count}
+    """
+    facets = {}
+    for column in columns:
+        facet = column.get_facet()
+        if facet in DATE_BUCKETS:
+            field = "facet_%s" % column.get_id()
+            grouped = queryset.order_by().extra(select={field: _bucket_sql(queryset, column, facet)})
+        else:
+            field = column.get_lookup()
+            grouped = queryset.order_by()
+
+        counts = [(group[field], group['facet_count']) for group in grouped.values(field).annotate(facet_count=Count('pk'))]
+        facets[column.get_id()] = [dict(column.format_facet(value), count=count)
+                                   for value, count in sorted(counts, key=_sort_key)]
+    return facets
+
+
+def _sort_key(item):
+    """ Sort the values of a facet. None comes last """
+    return (item[0] == None, item[0])
+
+
+class FacetIndex(object):
+    """
+    Computes and caches the facets of a grid. It is configured as the setting `facet_index` of the grid.
+    The facets are cached for each filtered queryset and filter-state (filters, search and extra
+    callback-params), so paging and sorting don't compute them again. invalidate (or
+    cache.invalidate_on_change) drops the cached facets of a grid-class, once its data changed.
+    """
+
+    def __init__(self, timeout=300, cache='default'):
+        """
+        @param timeout The time in seconds the facets are cached. If 0, they are not cached at all
+        @param cache The alias of the django cache-backend to use
+        """
+        self.__cache = StateCache(timeout, cache, 'facets') if timeout else None
+
+    def get(self, grid, queryset, columns, state):
+        """
+        Return the facets of the columns
+        @param grid The grid that is rendered
+        @param queryset The filtered queryset
+        @param columns The (bound) columns having a facet
+        @param state The normalized filter-state of the grid
+        @return dict column-id: list of dicts {value, label, mode, count}
+        """
+        compute = lambda: compute_facets(queryset, columns)
+        if self.__cache == None:
+            return compute()
+        return self.__cache.get(grid, queryset, [[c.get_id() for c in columns], state], compute)
+
+    def invalidate(self, grid_class):
+        """ Drop all cached facets of the grid-class """
+        if self.__cache != None:
+            self.__cache.invalidate(grid_class)
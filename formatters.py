@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the formatters of the typed columns. Instead of building the format for each value, a column
+compiles its formatter once, when the schema of the grid is built. A formatter is a function, which gets the
+raw value and returns the formatted unicode-string (an empty string for None). The separators of localized
+formatters depend on the active language, so the columns compile them once for each language.
+"""
+
+# Lib-Imports
+import operator
+import re
+
+# Django imports
+from django.utils import formats
+
+
+def locale_separators():
+    """
+    Return the decimal- and thousand-separator of the active language (or LANGUAGE_CODE of the project,
+    if no language is active). The thousand-separator is None, if the project doesn't use it.
+    @return tuple (decimal_separator, thousand_separator)
+    """
+    thousand_separator = formats.get_format('THOUSAND_SEPARATOR') if formats.get_format('USE_THOUSAND_SEPARATOR') else None
+    return formats.get_format('DECIMAL_SEPARATOR'), thousand_separator
+
+
+def compile_number(pre_digits=None, digits=None, decimal_separator=u".", thousand_separator=None, width=None, symbol=None):
+    """
+    Compile the formatter of a number
+    @param pre_digits The minimal amount of digits before the decimal-separator (padded with zeros)
+    @param digits The amount of digits after the decimal-separator. If not given, the number is printed as integer
+    @param decimal_separator The separator of the digits
+    @param thousand_separator The separator of the thousands or None
+    @param width The minimal width of the number (padded with spaces), if pre_digits isn't given
+    @param symbol The unit appended to the number (like the currency-symbol)
+    @return function value -> unicode
+    """
+    if pre_digits:
+        padding = "0%d" % (pre_digits + (digits + 1 if digits else 0))
+    else:
+        padding = "%d" % width if width else ""
+    precision = ".%d" % digits if digits else ""
+
+    if thousand_separator:
+        format = u"{:%s,%s%s}" % (padding, precision, "f" if digits else "d")
+        convert = (lambda value: format.format(value)) if digits else (lambda value: format.format(int(value)))
+    else:
+        format = u"%" + padding + precision + ("f" if digits else "d")
+        convert = lambda value: format % value
+
+    # Exchange the separators in a single pass
+    table = {}
+    if decimal_separator != u".":
+        table[ord(u".")] = unicode(decimal_separator)
+    if thousand_separator and thousand_separator != u",":
+        table[ord(u",")] = unicode(thousand_separator)
+    if table:
+        convert = _chain(convert, lambda text: text.translate(table))
+    if symbol:
+        suffix = u" %s" % symbol
+        convert = _chain(convert, lambda text: text + suffix)
+    return _skip_none(convert)
+
+
+# The directives of a date-format, which are formatted from the attributes of the date instead of strftime
+_DATE_DIRECTIVES = {
+    'd': ("%02d", 'day'),
+    'm': ("%02d", 'month'),
+    'Y': ("%04d", 'year'),
+}
+
+
+def compile_date(format):
+    """
+    Compile the formatter of a date. Formats consisting only of days, months and years (like `%d.%m.%Y`) are
+    formatted from the attributes of the date, which is much faster than strftime and also works for
+    years before 1900. All other formats use strftime.
+    @param format The format in the syntax of strftime
+    @return function value -> unicode
+    """
+    # Every second part is a directive
+    parts = re.split(r"%(.)", format)
+    directives = parts[1::2]
+    if not any(d in _DATE_DIRECTIVES for d in directives) or not all(d in _DATE_DIRECTIVES or d == '%' for d in directives):
+        return _skip_none(lambda value: unicode(value.strftime(format)))
+
+    template = u""
+    attributes = []
+    for nr, part in enumerate(parts):
+        if nr % 2 == 0 or part == '%':
+            template += part.replace(u"%", u"%%")
+        else:
+            template += _DATE_DIRECTIVES[part][0]
+            attributes.append(_DATE_DIRECTIVES[part][1])
+
+    # With a single attribute the getter returns the value instead of a tuple, which works as well
+    getter = operator.attrgetter(*attributes)
+    return _skip_none(lambda value: template % getter(value))
+
+
+def _chain(first, second):
+    return lambda value: second(first(value))
+
+
+def _skip_none(convert):
+    return lambda value: u"" if value is None else convert(value)
@@ -2,35 +2,114 @@
 
 # Lib-Imports
 import simplejson
-import copy
+import timeit
 
 # Django imports
+from django.db.models import Q
 from django.forms import Media
-from django.forms.widgets import Widget
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # Before django 1.5 the HttpResponse streams iterators itself
+    from django.http import HttpResponse as StreamingHttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
+from django.forms.widgets import Widget, MediaDefiningClass
 from django.template.context import RequestContext
 from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
 from django.utils.safestring import mark_safe
 
-from django.core.paginator import Paginator, InvalidPage, EmptyPage
-
 # Grid-Imports
-from columns import Column
+from columns import Column, TextColumn
+from columns_filter import Filter, find_unindexed
+from aggregation import compute_aggregates
 from exceptions import *
-from resource_handler import GridResourceHandler
+from facets import FacetIndex
+from export import EXPORT_FORMATS
+from parallel import run_parallel
+from profiling import NullProfile, Profile, grid_profiled
+from pagination import ExactCount, KeysetPaginator, OffsetPaginator
+from projection import Projection
+from renderer import RowRenderer
+from resource_handler import get_resource_handler
+from search import ContainsSearch
+from serialization import json_default
+from state import (decode_state, filter_state, get_request_version, is_encoded_state, link_state, normalize_state,
+                   state_etag)
+
+
+class GridSchema(object):
+    """
+    The schema of a grid-class. It contains the ordered columns and the settings of the class and is created 
+    only once for each class by the GridMetaclass. The schema is shared by all instances of the grid and
+    must not be changed
+    """
+    
+    def __init__(self, columns, settings):
+        """
+        @param columns The initialized columns of the grid, sorted by their number
+        @param settings The settings of the grid-class, merged with the defaults
+        """
+        self.columns = tuple(columns)
+        self.settings = settings
+        self.column_map = dict((c.get_id(), c) for c in self.columns)
+        self.__projections = {}
+        self.__unindexed = {}
+        self.__media = None
+        
+    def get_projection(self, model):
+        """
+        Return the projection of the visible columns for the given model. The projection is only 
+        created once for each model
+        """
+        projection = self.__projections.get(model)
+        if projection == None:
+            projection = Projection(model, [c for c in self.columns if c.is_visible()])
+            self.__projections[model] = projection
+        return projection
+    
+    def get_unindexed_filters(self, model):
+        """
+        Return the ids of the filterable columns, whose field has no database-index. This is only 
+        checked once for each model
+        """
+        unindexed = self.__unindexed.get(model)
+        if unindexed == None:
+            unindexed = self.__unindexed[model] = find_unindexed(model, self.columns)
+        return unindexed
+    
+    def get_media(self, resources):
+        """
+        Return the media (js and css) of the grid. It is only created once
+        @param resources The GridResourceHandler resolving the urls
+        """
+        if self.__media == None:
+            self.__media = Media(css = {'all':(resources.css("grid.css"), )},
+                                 js = (resources.js("grid.js"), ))
+        return self.__media
+        
 
-# Project-Settings
-from django.conf import settings as project_settings
+class GridMetaclass(MediaDefiningClass):
+    """
+    Metaclass for the grid. This will compile the schema of each grid-class once it is defined, so the
+    settings and columns of the class don't have to be searched on every request
+    """
+    
+    def __new__(mcs, name, bases, attrs):
+        new_class = super(GridMetaclass, mcs).__new__(mcs, name, bases, attrs)
+        new_class._schema = new_class._compile_schema()
+        return new_class
 
 
 class Grid(Widget):
     """
     Grid-Widget for Django, that displays a dataset with pagination, enables sorting and filtering data, multi-column layout and so forth
     """
+    __metaclass__ = GridMetaclass
 
-    # the js/css that is neccessary to operate the grid
+    # the js/css that is neccessary to operate the grid. It is created only once for each grid-class
     def _media(self):
-        return Media(css = {'all':(self.resources.css("grid.css"), )},
-                    js = (self.resources.js("grid.js"), ))
+        return self._schema.get_media(self.resources)
     media = property(_media)
     
     
@@ -38,60 +117,159 @@ class Grid(Widget):
     __default_settings = {
         'grid_init_template' : 'grid_widget/grid_init.html',
         'grid_view_template' : 'grid_widget/grid_view.html',
+        'grid_paginator_template' : 'grid_widget/grid_paginator.html',
         'column_head_template' : 'grid_widget/column_header.html',
         'column_content_template' : 'grid_widget/column_content.html',
+        'column_head_filters_template' : 'grid_widget/column_header_filters.html',
+        'column_head_facets_template' : 'grid_widget/column_header_facets.html',
         'width': 800,
         'entries_per_page': 20,
         'error_handler': "",
         'show_controls': True,
         
+        # Render the static part of the column-headers only once per grid and language (see Column.render_head).
+        # The head-template is rendered with the context-processors of the first request, so this should be 
+        # disabled, if the template depends on the request (like the current user)
+        'cache_column_heads': True,
+        
+        # Page by the values of the sorted columns instead of an offset. keyset_count defines, if the total 
+        # amount of pages should still be counted in that case
+        'keyset_pagination': False,
+        'keyset_count': False,
+        
+        # The CountProvider used to determine the total amount of rows for the paginator
+        'count_provider': ExactCount(),
+        
+        # Only fetch the fields of the model, that are needed to display the visible columns
+        'only_column_fields': False,
+        
+        # The GridCache used to cache the rendered views. If None, the views are not cached
+        'view_cache': None,
+        
+        # The StateVersions used to skip requests, which were superseded by a newer request of the same client.
+        # If None, all requests are processed
+        'state_versions': None,
+        
+        # Send the requests of the client as GET with the encoded state (see state.encode_state), so the responses
+        # may be cached by the browser. The client-id and version are left out of GET-requests, because they would
+        # make each url unique, so the StateVersions are not used then
+        'get_requests': False,
+        
+        # A value or callable (getting the request) identifying the version of the data (like the latest
+        # modification-date or the current user, if the data depends on it). If set, the views returned by
+        # response() for GET-requests get an ETag and unchanged views are answered with 304 (Not Modified)
+        'etag_version': None,
+        
+        # The StateSnapshots storing the state of each view under a short id, which is used for links to the view.
+        # If None, the links contain the whole encoded state
+        'state_snapshots': None,
+        
+        # The bulk-actions (see actions.py) as dict name: BulkAction, which can be run on the selected rows (see
+        # SelectColumn). The client posts them to action_url (a string or callable), whose view calls Grid.action
+        'actions': {},
+        'action_url': None,
+        
+        # Page and sort the grid by requesting only the rows as json and render them in the browser
+        'client_rendering': False,
+        
+        # Replace the paginator by a scrollable table, that loads the following pages as row-windows while
+        # scrolling. Only the rows within the visible area are kept in the DOM. scroll_height is the height
+        # of the scrollable area in px
+        'infinite_scroll': False,
+        'scroll_height': 500,
+        
+        # The amount of rows fetched with each query while exporting
+        'export_chunk_size': 2000,
+        
+        # Measure the time, queries and templates of each stage of a request (see profiling.py). The profile
+        # is sent with the signal grid_profiled. If profile_panel is set, it is also displayed below the grid
+        'profile': False,
+        'profile_panel': False,
+        
+        # Run the independent queries of a view (page, count, facets and aggregates) concurrently on threads.
+        # Each thread uses its own database-connection, so this should only be used for reading committed data
+        'parallel_queries': False,
+        
+        # The StateCache used to cache the aggregates of the columns. If None, they are computed for each request
+        'aggregate_cache': None,
+        
+        # The FacetIndex computing the distinct values of the columns having a facet. If None, no facets are shown
+        'facet_index': FacetIndex(),
+        
+        # The SearchBackend used for the quick-search and the ids of the (text-)columns it searches in.
+        # If no columns are given, the quick-search is disabled
+        'search_backend': ContainsSearch(),
+        'search_columns': (),
+        
         # Settings which MUST be defined in the subclass
         'grid_id': None,
         'url': None,
     }
+    __required_settings = ('grid_id', 'url')
+    
+    
+    @classmethod
+    def _compile_schema(cls):
+        """
+        This will create the schema of this grid-class. It is called once by the GridMetaclass, when the class 
+        is defined. First the defaults defined above are read, then the settings defined in the subclass are applied.
+        Afterwards all columns of the class are collected, initialized with their id and sorted by their number.
+        @return GridSchema The schema describing this grid-class
+        """
+        # Collect the attributes along the mro, so subclasses override their parents. The raw attributes are used
+        # so functions (like a lambda given as url) are kept as they are and do not become methods
+        attributes = {}
+        for klass in reversed(cls.__mro__):
+            attributes.update(klass.__dict__)
+        
+        # set the defaults and override them with the ones defined in the subclass
+        settings = dict(cls.__default_settings)
+        for k in cls.__default_settings:
+            if k in attributes:
+                settings[k] = attributes[k]
+        
+        # Find all columns and assign their ids
+        columns = []
+        for attribute_name, possible_column in attributes.items():
+            if isinstance(possible_column, Column):
+                possible_column.initialize(attribute_name)
+                columns.append(possible_column)
+        
+        # Sort all columns by their assigned number
+        columns.sort(key=lambda c: c.get_nr())
+        
+        return GridSchema(columns, settings)
+    
     
     def __init_settings(self, settings):
         """
-        This will initialize the settings for this grid. This method will first read the defaults defined above,
-        then parse all defined settings in the subclass. Afterwards it will adapt the settings given to the function.
+        This will initialize the settings for this grid. The settings compiled in the schema of the class 
+        are used as base and the settings given to this function are applied on top of them. 
         The resulting dictionary will be checked, if all required settings, as defined above, are present. If not
         a GridConfigurationException will be Thrown.
         @param settings The settings-dict given to init/view-function
         @throws GridConfigurationException If a required config is missing.
         """
         
-        # set the defaults
-        self.__settings = copy.deepcopy(self.__default_settings)
-        
-        # get the ones defined in the subclass
-        for k, v in self.__default_settings.items():
-            if k in dir(self):
-                self.__settings[k] = getattr(self, k)
-        
-        # Update with the settings given to this function
-        self.__settings.update(settings or {})
-        
+        # The schema-settings are shared by all instances, so only copy them if they need to be adapted.
+        # The given settings are kept, as they are part of the key of the view_cache
+        self.__settings_overrides = settings
+        if settings:
+            self.__settings = dict(self._schema.settings)
+            self.__settings.update(settings)
+        else:
+            self.__settings = self._schema.settings
         
         # Check all required settings are given and != None
-        for k, v in self.__default_settings.items():
+        for k in self.__required_settings:
             if self.__settings[k] == None:
                 raise GridConfigurationException("Missing setting %s" % k)
             
         
     def __initialize_columns(self, request):
-        """ This will read the column-infos from the grid-subclass and 
-        call the initialize-method on all of them """
-        self.__columns = []
-        for attribute_name in dir(self):
-            possible_column = getattr(self, attribute_name)
-            
-            # Check if the possible_column is really a column and if so, initialize it
-            if isinstance(possible_column, Column):
-                possible_column.initialize(request, attribute_name, self.__grid_id, self.__settings)
-                self.__columns.append(c)
-                
-        # Sort all columns by their assigned number
-        self.__columns = sorted(self.__columns, key=lambda c: c.get_nr())
+        """ This will take the columns from the schema of the grid-class and 
+        bind them to the current request. The columns of the schema are never changed """
+        self.__columns = [c.bind(request, self.__grid_id, self.__settings) for c in self._schema.columns]
         
         
 
@@ -105,12 +283,34 @@ class Grid(Widget):
         @param settings Settings-Dictionary which is used to for getting some static vars like templates etc.
         """
         super(Widget, self).__init__()
+        setup_start = timeit.default_timer()
         
-        self.resources = GridResourceHandler(project_settings.STATIC_URL)
+        self.resources = get_resource_handler()
 
         # Read passed options
         self.__init = init
         self.__request = request
+        self.__format = 'html'
+        self.__filtered_columns = set()
+        
+        # The key and content of the view-cache
+        self.__cache_key = None
+        self.__cached_view = None
+        
+        # The client-id and version sent with the state
+        self.__version = None
+        
+        # The ETag of the view, if the client already has the view, and the id of the snapshot of the state
+        self.__etag = None
+        self.__not_modified = False
+        self.__state_id = None
+        self.__initial_state = None
+        
+        # The filtered (not paged) queryset and its filter-state, which facets and aggregates are computed with
+        self.__filtered_queryset = None
+        self.__filter_state = None
+        self.__aggregates = None
+        self.__facets_prepared = False
         
         # parse settings
         self.__grid_id = self.grid_id
@@ -118,6 +318,11 @@ class Grid(Widget):
         
         # Initialise the columns
         self.__initialize_columns(self.__request)
+        
+        # The profile measuring the stages of the request
+        self.__profile = Profile() if self.__settings['profile'] else NullProfile()
+        self.__profile_finished = False
+        self.__profile.add('setup', timeit.default_timer() - setup_start)
 
     def get_id(self):
         """ Return the id of this grid """
@@ -126,14 +331,80 @@ class Grid(Widget):
 
     def render(self):
         """ This will start the rendering-process. If the grid is in init-mode, render_init will be called, otherwise render_content """
-        return self.__render_init() if self.__init else self.__render_view()
+        try:
+            return self.__render()
+        finally:
+            self.__finish_profile()
+    
+    
+    def __finish_profile(self):
+        """
+        Finish the profile of the request and send it with grid_profiled. Every entry-point of the grid must
+        call this, otherwise the debug-cursor stays enabled. It does nothing, if the profile is already finished
+        """
+        if self.__settings['profile'] and not self.__profile_finished:
+            self.__profile_finished = True
+            self.__profile.finish()
+            grid_profiled.send(sender=type(self), grid=self, profile=self.__profile)
+    
+    
+    def __render(self):
+        if self.__init:
+            return self.__render_init()
+        
+        # The client already has the current view (see response)
+        if self.__not_modified:
+            return u""
+        
+        # The client already sent a newer request and will ignore this response
+        if self.is_stale():
+            return self.__render_stale()
+        
+        # Use the cached view, if it was found while preparing
+        if self.__cached_view != None:
+            return mark_safe(self.__cached_view)
+        
+        rendered = self.__render_json() if self.__format == 'json' else self.__render_view()
+        if self.__cache_key != None:
+            self.__settings['view_cache'].set(self.__cache_key, unicode(rendered))
+        return rendered
+    
+    
+    def response(self):
+        """
+        Render the grid and return it as HttpResponse. If the setting etag_version is set, the response to a
+        GET-request gets an ETag. If the client already has the current view, it is answered with 304 (Not Modified)
+        without querying or rendering anything.
+        @return HttpResponse
+        """
+        content = self.render()
+        if self.__not_modified:
+            response = HttpResponseNotModified()
+        else:
+            json = not self.__init and self.__format == 'json'
+            response = HttpResponse(content, content_type='application/json' if json else 'text/html; charset=utf-8')
+        if self.__etag != None:
+            response['ETag'] = self.__etag
+            
+            # The browser has to revalidate the view each time, because the data may change at any time
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
+    
+    def get_profile(self):
+        """ Return the Profile of the request or None, if the grid isn't profiled """
+        return self.__profile if self.__settings['profile'] else None
     
     
     def get_request_parameters(self, request):
         """ This will load the request-parameters from the request and try to 
         convert them to json """
-         # Load the params in the request
-        if 'debug' in request.GET:
+        # The encoded state (or the id of its snapshot) sent with GET-requests
+        if 'grid_state' in request.GET:
+            return self.load_state(request.GET['grid_state'])
+        
+         # Load the params in the request. The state is passed as GET-parameter for debugging and exports
+        if 'debug' in request.GET or 'grid_data' in request.GET:
             state = request.GET['grid_data']
         else:
             state = request.POST.get('grid_data', '{}')
@@ -143,6 +414,23 @@ class Grid(Widget):
         #unicode_fixed = dict([(str(k), v) for k, v in parameter.items()])
         return parameter
     
+    
+    def load_state(self, value):
+        """
+        Decode the state sent as string. This is either an encoded state (see state.encode_state) or the id
+        of a snapshot (see the setting state_snapshots)
+        @param value The string sent by the client
+        @return dict The parameters of the grid
+        @throws InvalidStateException If the state is invalid or the snapshot doesn't exist (anymore)
+        """
+        if not is_encoded_state(value):
+            snapshots = self.__settings['state_snapshots']
+            encoded = snapshots.load(self.get_id(), value) if snapshots != None else None
+            if encoded == None:
+                raise InvalidStateException(u"Zustand nicht gefunden")
+            value = encoded
+        return decode_state(value)
+    
     # ============================================================================================
     # Init - Methods for creating the init-part of the grid
 
@@ -158,6 +446,14 @@ class Grid(Widget):
         grid.__preset_filter = []
         grid.__extra_callback_params = {}
         grid.__extra_css_classes = []
+        
+        # Restore the state of a link to the view (like ?<grid_id>_state=...). Outdated links show the grid without it
+        value = request.GET.get("%s_state" % grid.get_id())
+        if value:
+            try:
+                grid.__initial_state = link_state(grid.load_state(value))
+            except InvalidStateException:
+                pass
         return grid
     
     
@@ -190,6 +486,8 @@ class Grid(Widget):
         # resolve the url (Extract it because self.url() wont work and passes self to the lambda-function)
         url = self.__settings['url']
         url = url() if callable(url) else url
+        action_url = self.__settings['action_url']
+        action_url = action_url() if callable(action_url) else action_url
         
         context = {
             'id' : self.get_id(),
@@ -198,9 +496,17 @@ class Grid(Widget):
             'preset_filter': mark_safe(simplejson.dumps(self.__preset_filter)),
             'error_handler': self.__settings['error_handler'],
             'extra_callback_params': mark_safe(simplejson.dumps(self.__extra_callback_params)),
+            'client_rendering': mark_safe(simplejson.dumps(self.__settings['client_rendering'])),
+            'infinite_scroll': mark_safe(simplejson.dumps(self.__settings['infinite_scroll'])),
+            'searchable': bool(self.__settings['search_columns']),
+            'get_requests': mark_safe(simplejson.dumps(self.__settings['get_requests'])),
+            'action_url': mark_safe(simplejson.dumps(action_url)),
+            # The state comes from the url, so it must not be able to close the script-tag
+            'state': mark_safe(simplejson.dumps(self.__initial_state, default=json_default).replace("<", "\\u003c")),
         }
         
-        return mark_safe(render_to_string(self.__settings['grid_init_template'], context, RequestContext(self.__request)))
+        with self.__profile.stage('template'):
+            return mark_safe(render_to_string(self.__settings['grid_init_template'], context, RequestContext(self.__request)))
         
 
     # ============================================================================================
@@ -216,11 +522,81 @@ class Grid(Widget):
         @return Grid The newly created grid with the adjustments
         """
         grid = cls(request, init=False, settings=settings)
-        parameters = grid.get_request_parameters(request)
-        grid.prepare(queryset, parameters, for_viewing=True)
+        with grid.__profile.stage('parameters'):
+            try:
+                parameters = grid.get_request_parameters(request)
+            except InvalidStateException:
+                # Like in init, outdated links (or dropped snapshots) show the grid without their state
+                parameters = {}
+        grid.__format = parameters.get('format', 'html')
+        
+        # Skip all the work, if the request is already superseded or the client already has the view
+        grid.__register_version(parameters)
+        if grid.is_stale() or grid.__check_etag(parameters):
+            return grid
+        
+        snapshots = grid.__settings['state_snapshots']
+        if snapshots != None:
+            grid.__state_id = snapshots.save(grid.get_id(), parameters)
+        
+        # The queryset is only evaluated, if the view is not cached
+        if not grid.__load_cached_view(queryset, parameters):
+            grid.prepare(queryset, parameters, for_viewing=True)
         return grid
     
     
+    def __register_version(self, parameters):
+        """
+        Remember the version sent by the client, if the setting state_versions is configured
+        @param parameters The parameters sent by the client
+        """
+        state_versions = self.__settings['state_versions']
+        self.__version = get_request_version(parameters)
+        if state_versions != None and self.__version != None:
+            state_versions.register(self.get_id(), *self.__version)
+    
+    
+    def __check_etag(self, parameters):
+        """
+        Compute the ETag of the view, if the setting etag_version is set, and check if the client already has it
+        @param parameters The parameters sent by the client
+        @return bool True if the view is not modified
+        """
+        version = self.__settings['etag_version']
+        if version == None or self.__request.method != 'GET':
+            return False
+        version = version(self.__request) if callable(version) else version
+        self.__etag = state_etag(self, parameters, version)
+        known = [etag.strip() for etag in self.__request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]
+        self.__not_modified = self.__etag in known
+        return self.__not_modified
+    
+    
+    def is_stale(self):
+        """ Check if the client sent a newer request in the meantime. The response of this one will be ignored """
+        state_versions = self.__settings['state_versions']
+        if state_versions == None or self.__version == None:
+            return False
+        return state_versions.is_stale(self.get_id(), *self.__version)
+    
+    
+    def __load_cached_view(self, queryset, parameters):
+        """
+        Look up the rendered view in the view-cache, if one is configured
+        @param queryset The queryset passed to the view
+        @param parameters The parameters sent by the client
+        @return bool True if the view was found
+        """
+        view_cache = self.__settings['view_cache']
+        if view_cache == None:
+            return False
+        
+        self.__cache_key = view_cache.make_key(self, self.__request, queryset, normalize_state(parameters),
+                                               self.__settings_overrides)
+        self.__cached_view = view_cache.get(self.__cache_key)
+        return self.__cached_view != None
+    
+    
     def prepare(self, queryset, parameters, for_viewing=True):
         """ Prepare the grid, columns and queryset for rendering. This will read the parameters and
         apply them to this grid. also each information for each column will be extracted and passed on
@@ -230,15 +606,222 @@ class Grid(Widget):
         """
         
         
-        # Extract the page
+        # The format the view is rendered in (html or json)
+        self.__format = parameters.get('format', 'html')
+        self.__send_columns = bool(parameters.get('columns'))
+        self.__window_only = bool(parameters.get('window'))
+        
+        # Filter the data
+        with self.__profile.stage('filter'):
+            queryset = self.__prepare_filters(queryset, parameters.get('filter') or [])
+            queryset = self.__prepare_search(queryset, parameters.get('search'))
+        
+        # The facets and aggregates are computed from the filtered data, once they are rendered
+        self.__filtered_queryset = queryset
+        self.__filter_state = filter_state(parameters)
+        
+        # Sort and extract the page
         if for_viewing:
-            self.__page = parameters.get('page', 1)
-            paginator = Paginator(queryset.all(), self.__settings['entries_per_page'])
+            ordering = self.__prepare_sorting(parameters.get('sorting') or {})
+            
+            # Only fetch the data needed to display the columns
+            projection = self._schema.get_projection(queryset.model)
+            queryset = projection.apply(queryset, only=self.__settings['only_column_fields'])
+            
+            # The rows are only counted, once the paginator needs to know the amount of pages
+            count_provider, filtered = self.__settings['count_provider'], queryset
+            count = self.__profile.wrap('count', lambda: count_provider.count(self, filtered))
+            
+            if self.__settings['keyset_pagination'] and not self.__settings['keyset_count']:
+                count = None
+            paginator = self.__create_paginator(queryset, ordering, self.__settings['entries_per_page'], 
+                                                self.__settings['keyset_pagination'], count)
+            if self.__settings['parallel_queries']:
+                with self.__profile.stage('parallel'):
+                    self.__page = self.__fetch_parallel(paginator, parameters.get('page', 1), parameters.get('cursor'))
+            else:
+                with self.__profile.stage('page'):
+                    self.__page = paginator.page(parameters.get('page', 1), parameters.get('cursor'))
+    
+    
+    def __fetch_parallel(self, paginator, number, cursor):
+        """
+        Fetch the page and run the other queries needed to render it (the count, the facets and the
+        aggregates) concurrently. Their results are kept, so rendering doesn't query them again.
+        @param paginator The paginator of the grid
+        @param number The number of the requested page
+        @param cursor The cursor of the requested page (keyset-pagination only)
+        @return The page
+        """
+        tasks = [self.__profile.wrap('page', lambda: paginator.page(number, cursor)), lambda: paginator.num_pages,
+                 self.get_aggregates]
+        if self.__format == 'html':
+            tasks.append(self.__prepare_facets)
+        return run_parallel(tasks, self.__profile)[0]
+    
+    
+    def __prepare_filters(self, queryset, filters):
+        """
+        This will compile all filters sent by the client into a single Q-object and apply it to the queryset.
+        Each filter is added to the active filters of its column. If a filter is invalid, the error is 
+        stored with the filter and it is ignored.
+        @param queryset The queryset to filter
+        @param filters List of dicts with the nr, the id of the column, the mode and the values of the filter
+        @return The filtered queryset
+        """
+        columns = dict((c.get_id(), c) for c in self.__columns)
+        condition = Q()
+        self.__filtered_columns = set()
+        
+        for nr, f in enumerate(filters):
+            column = columns.get(f.get('id'))
+            if column == None:
+                continue
+            
+            values = f.get('values') or []
+            values = values if isinstance(values, list) else [values]
             try:
-                queryset = paginator.page(self.__page)
-            except InvalidPage, EmptyPage:
-                self.__page = 1
-                queryset = paginator.page(1)
+                condition &= column.compile_filter(f.get('mode'), values)
+                self.__filtered_columns.add(column.get_id())
+                error = None
+            except InvalidFilterException as e:
+                error = unicode(e)
+            
+            # The number is written into the javascript of the header, so only integers are accepted
+            number = f.get('nr', nr)
+            column.filters.append({
+                'nr': number if isinstance(number, (int, long)) else nr,
+                'column_id': column.get_label(),
+                'mode': Filter.get_mode_description(f.get('mode')),
+                'value': values,
+                'error': mark_safe(error) if error else None,
+            })
+        
+        if not self.__filtered_columns:
+            return queryset
+        
+        # Check (once) if the filtered columns are indexed, which logs a warning for each unindexed one
+        self._schema.get_unindexed_filters(queryset.model)
+        return queryset.filter(condition)
+    
+    
+    def __prepare_search(self, queryset, text):
+        """
+        This will restrict the queryset to the rows matching the text of the quick-search in any of the
+        search_columns. The search is done by the configured search_backend. The terms are highlighted in
+        the searched columns.
+        @param queryset The queryset to search in
+        @param text The text entered in the search-box
+        @return The restricted queryset
+        @throws GridConfigurationException If a search_column is not a TextColumn of the grid
+        """
+        search_columns = self.__settings['search_columns']
+        if not text or not search_columns:
+            return queryset
+        
+        backend = self.__settings['search_backend']
+        columns = [c for c in self.__columns if c.get_id() in search_columns]
+        for column in columns:
+            if not isinstance(column.column, TextColumn):
+                raise GridConfigurationException("The search-column %s is not a TextColumn" % column.get_id())
+        if len(columns) != len(search_columns):
+            raise GridConfigurationException("Unknown search-column in %s" % ", ".join(search_columns))
+        
+        terms = backend.get_terms(text)
+        for column in columns:
+            column.search_terms = terms
+        return backend.search(queryset, [c.get_lookup() for c in columns], text)
+    
+    
+    def __prepare_facets(self):
+        """ Compute the facets of the columns having one with the facet_index (or load them from its cache) """
+        if self.__facets_prepared:
+            return
+        self.__facets_prepared = True
+        
+        facet_index = self.__settings['facet_index']
+        columns = [c for c in self.__columns if c.get_facet()]
+        if facet_index == None or not columns or self.__filtered_queryset == None or not self.__settings['show_controls']:
+            return
+        
+        with self.__profile.stage('facets'):
+            facets = facet_index.get(self, self.__filtered_queryset, columns, self.__filter_state)
+        for column in columns:
+            column.facet = facets.get(column.get_id())
+    
+    
+    def get_aggregates(self):
+        """
+        Return the aggregates of the columns declaring one. They are computed over all filtered rows
+        with a single query (or loaded from the aggregate_cache) once the grid is prepared.
+        @return dict column-id: aggregated value
+        """
+        if self.__aggregates == None:
+            columns = [c for c in self.__columns if c.get_aggregate()]
+            aggregate_cache = self.__settings['aggregate_cache']
+            compute = self.__profile.wrap('aggregates', lambda: compute_aggregates(self.__filtered_queryset, columns))
+            if not columns or self.__filtered_queryset == None:
+                self.__aggregates = {}
+            elif aggregate_cache != None:
+                state = [[c.get_id() for c in columns], self.__filter_state]
+                self.__aggregates = aggregate_cache.get(self, self.__filtered_queryset, state, compute)
+            else:
+                self.__aggregates = compute()
+        return self.__aggregates
+    
+    
+    def __render_footer(self):
+        """ Render the cells of the footer containing the aggregates of the visible columns or None, if there are none """
+        aggregates = self.get_aggregates()
+        if not aggregates:
+            return None
+        columns = [c for c in self.__columns if c.is_visible()]
+        return [mark_safe(c.render_aggregate(aggregates[c.get_id()])) if c.get_id() in aggregates else u"" for c in columns]
+    
+    
+    def get_unindexed_filters(self, model):
+        """
+        Return the ids of the columns filtered in this request, whose field has no database-index
+        @param model The model of the queryset
+        """
+        unindexed = self._schema.get_unindexed_filters(model)
+        return [c for c in unindexed if c in self.__filtered_columns]
+    
+    
+    def __create_paginator(self, queryset, ordering, per_page, keyset, count=None):
+        """
+        Create the paginator for the queryset. Keyset-pagination is only possible, if no nullable column is sorted
+        and the rows aren't ordered by the rank of a search-backend (which can't be seeked). Otherwise the
+        OffsetPaginator is used.
+        @param queryset The queryset to page
+        @param ordering List of tuples (lookup, ascending) as returned by __prepare_sorting
+        @param per_page The amount of rows on each page
+        @param keyset Use the KeysetPaginator, if possible
+        @param count Callable returning the amount of rows. None, if the rows shouldn't be counted
+        @return KeysetPaginator or OffsetPaginator
+        """
+        nullable = [c for c in self.__columns if c.sorting != None and c.is_nullable()]
+        ranked = not ordering and queryset.query.extra_order_by
+        if keyset and not nullable and not ranked:
+            return KeysetPaginator(queryset.all(), per_page, ordering, count=count)
+        
+        if ordering:
+            queryset = queryset.order_by(*["%s%s" % ("" if asc else "-", lookup) for lookup, asc in ordering] + ['pk'])
+        return OffsetPaginator(queryset.all(), per_page, count=count)
+    
+    
+    def __prepare_sorting(self, sorting):
+        """
+        This will mark the sorted column and return the ordering to apply to the queryset
+        @param sorting Dict with the id of the sorted column and the direction (1 for ascending, -1 for descending)
+        @return list of tuples (lookup, ascending)
+        """
+        ordering = []
+        for column in self.__columns:
+            if column.get_id() == sorting.get('column') and column.is_sortable():
+                column.sorting = int(sorting.get('direction', 1)) >= 0
+                ordering.append((column.get_lookup(), column.sorting))
+        return ordering
 
 
     def __render_view(self):
@@ -252,72 +835,263 @@ class Grid(Widget):
 
 
         # Render the header
-        rendered_heads = [c.render_head() for c in self.__columns]
+        self.__prepare_facets()
+        with self.__profile.stage('head'):
+            rendered_heads = [c.render_head() for c in self.__columns]
         
-        # render the columns
-        rendered_rows = []
-        for row in self.__model:
-            data = []
-            for column in self.__columns:
-                if column.is_visible():
-                    data.append(column.render_content(self.__request, row))
-            rendered_rows.append({'id': row.get_value('pk'), 'data':data})
-        
-        # Get the paginator infos
-        page = self.__model.get_page()
+        # render the rows in a single pass
+        with self.__profile.stage('rows'):
+            renderer = RowRenderer(self.__request, self.__settings['column_content_template'], self.__columns)
+            rendered_rows = renderer.render(self.__page.object_list)
         
         # Get invisible filters and add neccessary info
         invisible_filter = []
         for c in self.__columns:
             if not c.is_visible() and c.show_filter_if_hidden():
-                invisible_filter.extend(self.__model.get_filter(c.get_id()))
-        for f in invisible_filter:            
-            f['mode'] = Column.Filter.get_mode_description(f['mode'])
-        
+                invisible_filter.extend(c.filters)
+
                 
         # Prepare the context
         context = {
             'id': self.get_id(),
             'head': rendered_heads,
             'rows': rendered_rows,
-            'current_page': page['current'],
-            'has_next_page': page['next'],
-            'has_prev_page': page['prev'],
-            'num_pages': page['count'],
+            'footer': self.__render_footer(),
             'extra_filter': invisible_filter,
             'show_controls': self.__settings['show_controls'],
+            'paginator_template': self.__settings['grid_paginator_template'],
+            'infinite_scroll': self.__settings['infinite_scroll'],
+            'scroll_height': self.__settings['scroll_height'],
+            'profile': self.__profile if self.__settings['profile'] and self.__settings['profile_panel'] else None,
+            'state_id': self.__state_id,
+            'actions': self.__get_actions(),
+        }
+        context.update(self.__get_paginator_context())
+        with self.__profile.stage('template'):
+            return mark_safe(render_to_string(self.__settings['grid_view_template'], context, RequestContext(self.__request)))
+    
+    
+    def __get_paginator_context(self):
+        """ Return the infos about the current page, that are needed to render the paginator """
+        return {
+            'id': self.get_id(),
+            'current_page': self.__page.number,
+            'has_next_page': self.__page.has_next(),
+            'has_prev_page': self.__page.has_previous(),
+            'num_pages': self.__page.paginator.num_pages,
+            'next_cursor': getattr(self.__page, 'next_cursor', None),
+            'previous_cursor': getattr(self.__page, 'previous_cursor', None),
+        }
+    
+    
+    def __render_stale(self):
+        """ Render the response to a stale request. The client ignores it, so it doesn't contain any data """
+        if self.__format == 'json':
+            return simplejson.dumps({'stale': True, 'version': self.__version[1]})
+        return u""
+    
+    
+    def __render_json(self):
+        """
+        This is called by the render-method, if the client requested the data as json. Only the rows and
+        the paginator are returned, which are used to update the grid in the browser. The rows are lists 
+        with the primary key followed by the values of the visible columns. The description of the columns 
+        is only sent, if the client requested it. If the client only requested the next window of rows while
+        scrolling, the paginator and the footer are left out.
+        @return String containing the json-data
+        """
+        columns = [c for c in self.__columns if c.is_visible()]
+        renderers = [c.get_json_renderer() for c in columns]
+        
+        with self.__profile.stage('rows'):
+            rows = [[row.pk] + [render(row) for render in renderers] for row in self.__page.object_list]
+        
+        data = {
+            'rows': rows,
+            'page': self.__page.number,
+            'has_next': self.__page.has_next(),
+            'next_cursor': getattr(self.__page, 'next_cursor', None),
         }
-        return render_to_response(self.__settings['grid_view_template'], context, context_instance=RequestContext(self.__request))
+        if self.__state_id != None:
+            data['state_id'] = self.__state_id
+        if not self.__window_only:
+            data['paginator'] = render_to_string(self.__settings['grid_paginator_template'], self.__get_paginator_context(), 
+                                                 RequestContext(self.__request))
+            footer = self.__render_footer()
+            if footer != None:
+                data['footer'] = footer
+        if self.__send_columns:
+            data['columns'] = [{'id': c.get_id(), 'html': c.json_html} for c in columns]
+        with self.__profile.stage('json'):
+            return simplejson.dumps(data, default=json_default)
         
 
     # ============================================================================================
-    # Data - Methods for generating a gridmodel for aggregating
+    # Export - Methods for exporting the entire data of the grid
 
     @classmethod
-    def data(cls, request, model, settings=None):
+    def export(cls, request, queryset, format='csv', settings=None):
         """
-        This will prepare a model and supply it with the same options the 
-        grid used to prepare itself. The returned model can be used while aggregating
-        This will prepare the grid for rendering in view-mode.
-        @param request The request-object that issued the render
-        @param model The model that should be used to prepare the data
+        Export all rows matching the filters and sorting of the grid. The rows are fetched in chunks
+        and the file is streamed to the client, so the rows are never loaded at once.
+        @param request The request-object that issued the export. It must contain the grid_data
+        @param queryset The queryset used to fetch the data
+        @param format The name of the export-format (csv, jsonl or xlsx)
+        @param settings Settings-dict that could override defaults
+        @return HttpResponse The (streaming) response containing the file
+        """
+        if format not in EXPORT_FORMATS:
+            raise GridConfigurationException("Unknown export-format %s" % format)
+        
+        grid = cls(request, init=False, settings=settings)
+        try:
+            parameters = grid.get_request_parameters(request)
+        finally:
+            # The rows are streamed once the response is returned, so they are not profiled
+            grid.__finish_profile()
+        exporter = EXPORT_FORMATS[format]([c for c in grid.__columns if c.is_visible() and c.exportable])
+        
+        response = StreamingHttpResponse(exporter.generate(grid.iterate(queryset, parameters)), 
+                                         content_type=exporter.content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (grid.get_id(), exporter.extension)
+        return response
+    
+    
+    def __get_actions(self):
+        """ Return the bulk-actions displayed below the grid as list of dicts {name, label, confirm} """
+        if not self.__settings['action_url'] or not self.__settings['show_controls']:
+            return []
+        return [{'name': name, 'label': action.get_label(), 'confirm': action.get_confirm() or ""}
+                for name, action in sorted(self.__settings['actions'].items())]
+    
+    
+    @classmethod
+    def action(cls, request, queryset, name=None, settings=None):
+        """
+        Run a bulk-action (see the setting actions) on the rows selected by the client. The selection is sent
+        with the state as `selection` (see selected). The rows are never loaded: The action gets the filtered
+        queryset. Actions reporting their progress are streamed as json-lines ({"done": 500, "total": 2000}),
+        the others are answered with a json-object containing the amount of processed rows ({"count": 12}).
+        The view calling this must check, if the user is allowed to run the action.
+        @param request The request-object that issued the action. It must contain the grid_data
+        @param queryset The queryset used to fetch the data
+        @param name The name of the action. If None, the action sent by the client (as `action`) is run
+        @param settings Settings-dict that could override defaults
+        @return HttpResponse The (streaming) response
+        @throws GridConfigurationException If the action doesn't exist
+        """
+        grid = cls(request, init=False, settings=settings)
+        try:
+            parameters = grid.get_request_parameters(request)
+            name = name if name != None else parameters.get('action')
+            action = grid.__settings['actions'].get(name)
+            if action == None:
+                raise GridConfigurationException("Unknown action %s" % name)
+            
+            queryset = grid.__prepare_selection(queryset, parameters)
+            if not action.reports_progress:
+                return HttpResponse(simplejson.dumps({'action': name, 'count': action.run(queryset)}), 
+                                    content_type='application/json')
+        finally:
+            # The progress is streamed once the response is returned, so it is not profiled
+            grid.__finish_profile()
+        
+        def progress():
+            total = queryset.count()
+            yield simplejson.dumps({'action': name, 'done': 0, 'total': total}) + "\n"
+            for done in action.iterate(queryset):
+                yield simplejson.dumps({'action': name, 'done': done, 'total': total}) + "\n"
+        return StreamingHttpResponse(progress(), content_type='application/x-ndjson; charset=utf-8')
+    
+    
+    @classmethod
+    def selected(cls, request, queryset, settings=None):
+        """
+        Return the rows selected by the client, restricted to the rows matching the filters and the search
+        of the grid. Like data, but also applying the selection.
+        @param request The request-object, whose state contains the selection
+        @param queryset The queryset used to fetch the data
         @param settings Additional Settings to pass to the grid
-        @return gridModel Prepared Grid-model
+        @return QuerySet The filtered queryset of the selected rows
+        """
+        grid = cls(request, init=False, settings=settings)
+        try:
+            return grid.__prepare_selection(queryset, grid.get_request_parameters(request))
+        finally:
+            grid.__finish_profile()
+    
+    
+    def __prepare_selection(self, queryset, parameters):
+        """
+        Apply the filters, the search and the selection sent by the client. The selection is a dict 
+        {all, ids}: If all is set, all rows matching the filters except the ids are selected, otherwise
+        only the ids (if they still match the filters). Without a selection no rows are selected.
+        @param queryset The queryset to operate on
+        @param parameters The parameters sent by the client
+        @return QuerySet The filtered queryset
         """
-        # Check the model is in aggregation-mode
-        if not model.is_aggregated():
-            raise Exception(u"The provided model is supposed to be aggregated!")
+        queryset = self.__prepare_filters(queryset, parameters.get('filter') or [])
+        queryset = self.__prepare_search(queryset, parameters.get('search'))
         
-        # Create the grid
-        grid = cls(request, init=False, state_handler=None, text_handler=None, settings=settings)
-        grid._set_model(model)       
+        selection = parameters.get('selection') or {}
+        ids = selection.get('ids') or []
+        if selection.get('all'):
+            return queryset.exclude(pk__in=ids) if ids else queryset
+        return queryset.filter(pk__in=ids)
+    
+    
+    def iterate(self, queryset, parameters):
+        """
+        Iterate over all rows matching the filters and the sorting given in the parameters. The rows are
+        fetched in chunks of export_chunk_size. If possible, the chunks are fetched by keyset-pagination,
+        otherwise by offset.
+        @param queryset The queryset to operate on
+        @param parameters Dict with all infos to prepare
+        @return Generator of the objects of the rows
+        """
+        queryset = self.__prepare_filters(queryset, parameters.get('filter') or [])
+        queryset = self.__prepare_search(queryset, parameters.get('search'))
+        ordering = self.__prepare_sorting(parameters.get('sorting') or {})
+        queryset = self._schema.get_projection(queryset.model).apply(queryset, only=self.__settings['only_column_fields'])
+        
+        paginator = self.__create_paginator(queryset, ordering, self.__settings['export_chunk_size'], keyset=True)
+        try:
+            page = paginator.page(1)
+            cursor = None
+            while True:
+                for row in page.object_list:
+                    yield row
+                if not page.has_next():
+                    break
+                
+                # A cursor, that doesn't advance, would fetch the same chunk forever
+                next_cursor = getattr(page, 'next_cursor', None)
+                if next_cursor != None and next_cursor == cursor:
+                    raise GridException("The cursor of the export did not advance")
+                cursor = next_cursor
+                page = paginator.page(page.number + 1, cursor)
+        finally:
+            self.__finish_profile()
+    
 
-        # prepare the model (Sorting, filter, ...)
-        state = request.POST.get('grid_data', '{}')
-        parameter = simplejson.loads(state, "utf8")
-        # Convert the keys to strings, because unicodes are not valid here!
-        unicode_fixed = dict([(str(k), v) for k, v in parameter.items()])
-        model.prepare(**unicode_fixed)
+    # ============================================================================================
+    # Data - Methods for generating a gridmodel for aggregating
 
-        return model
+    @classmethod
+    def data(cls, request, queryset, settings=None):
+        """
+        This will apply the filters and the search sent by the client to the queryset, so it contains
+        the same rows as the grid (without sorting and paging). It can be used for further processing,
+        like aggregating the data.
+        @param request The request-object that issued the render
+        @param queryset The queryset used to fetch the data
+        @param settings Additional Settings to pass to the grid
+        @return QuerySet The filtered queryset
+        """
+        grid = cls(request, init=False, settings=settings)
+        try:
+            grid.prepare(queryset, grid.get_request_parameters(request), for_viewing=False)
+        finally:
+            grid.__finish_profile()
+        return grid.__filtered_queryset
     
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+# Lib-Imports
+import base64
+import simplejson
+
+# Django imports
+from django.db import connections
+from django.db.models import Model, Q
+
+# Grid-Imports
+from cache import get_cache, make_key
+from serialization import decode_typed, encode_typed
+
+
+# ============================================================================================
+# Count-Providers, that define how the total amount of rows is determined
+
+class CountProvider(object):
+    """
+    Base-class for all count-providers. A count-provider is configured as the setting `count_provider`
+    of the grid and returns the total amount of rows of the (filtered) queryset
+    """
+
+    def count(self, grid, queryset):
+        """
+        @param grid The grid the rows are counted for
+        @param queryset The filtered queryset
+        @return int The amount of rows or None, if the rows shouldn't be counted
+        """
+        raise NotImplementedError()
+
+
+class ExactCount(CountProvider):
+    """ Count the rows with a `COUNT(*)` on every request """
+
+    def count(self, grid, queryset):
+        return queryset.count()
+
+
+class NoCount(CountProvider):
+    """ Never count the rows. The paginator will only know, if there is a next page """
+
+    def count(self, grid, queryset):
+        return None
+
+
+class CachedCount(CountProvider):
+    """
+    Count the rows exactly, but store the result in the cache. The key is built from the sql of the
+    queryset, which contains the filters, so paging or sorting never count the rows again
+    """
+
+    def __init__(self, timeout=300, cache='default', provider=None):
+        """
+        @param timeout The time in seconds the count is cached
+        @param cache The alias of the cache-backend to use
+        @param provider The count-provider used on a cache-miss. Defaults to ExactCount
+        """
+        self.__timeout = timeout
+        self.__cache = cache
+        self.__provider = provider or ExactCount()
+
+    def count(self, grid, queryset):
+        # The ordering doesn't change the amount of rows, so it is removed from the key
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = make_key("%s:count" % grid.get_id(), queryset.db, sql, params)
+        cache = get_cache(self.__cache)
+
+        count = cache.get(key)
+        if count == None:
+            count = self.__provider.count(grid, queryset)
+            cache.set(key, count, self.__timeout)
+        return count
+
+
+class EstimatedCount(CountProvider):
+    """
+    Use the estimation of the postgres-planner instead of counting the rows. If the queryset is not filtered
+    the statistics of the table (reltuples) are used, otherwise the estimate of `EXPLAIN`. If the estimate
+    is below `exact_below` or the database is not postgres, the rows are counted exactly.
+    """
+
+    def __init__(self, exact_below=10000):
+        """
+        @param exact_below If less rows are estimated, count them exactly
+        """
+        self.__exact_below = exact_below
+
+    def __estimate(self, queryset):
+        """ Return the estimated amount of rows from the postgres-statistics """
+        cursor = connections[queryset.db].cursor()
+        if not queryset.query.where:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            return int(row[0]) if row else None
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) %s" % sql, params)
+        plan = cursor.fetchone()[0]
+        plan = simplejson.loads(plan) if isinstance(plan, basestring) else plan
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def count(self, grid, queryset):
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.count()
+
+        estimate = self.__estimate(queryset)
+        if estimate == None or estimate < self.__exact_below:
+            return queryset.count()
+        return estimate
+
+
+# ============================================================================================
+# Paginators
+
+
+class OffsetPage(object):
+    """
+    A page of the OffsetPaginator. It offers the same interface as the page of the django-paginator
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.__has_next = has_next
+
+    def has_next(self):
+        return self.__has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+
+class OffsetPaginator(object):
+    """
+    Paginator that pages by an offset. Unlike the django-paginator it doesn't need the amount of rows
+    to fetch a page: One more row than needed is fetched, to know if there is a next page. The amount
+    of rows is only determined, if num_pages is accessed.
+    """
+
+    def __init__(self, queryset, per_page, count=None):
+        """
+        @param queryset The queryset to page
+        @param per_page The amount of rows on each page
+        @param count Callable returning the amount of rows (or None, if unknown). It is only called, if needed.
+        """
+        self.__queryset = queryset
+        self.per_page = per_page
+        self.__count = count
+        self.__num_pages = None
+        self.__counted = False
+
+    def __get_num_pages(self):
+        """ Return the amount of pages or None, if the amount of rows is unknown """
+        if not self.__counted:
+            self.__counted = True
+            hits = self.__count() if self.__count else None
+            if hits != None:
+                self.__num_pages = (max(1, hits) + self.per_page - 1) // self.per_page
+        return self.__num_pages
+    num_pages = property(__get_num_pages)
+
+    def page(self, number=1, cursor=None):
+        """
+        Return the page with the given number. If the page doesn't exist, the first page is returned.
+        @param number The number of the page, starting with 1
+        @param cursor Ignored. This is only accepted to offer the same interface as the KeysetPaginator
+        @return OffsetPage
+        """
+        try:
+            number = max(1, int(number))
+        except (TypeError, ValueError):
+            number = 1
+
+        offset = (number - 1) * self.per_page
+        rows = list(self.__queryset[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self.page(1)
+        return OffsetPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+
+class KeysetPage(object):
+    """
+    A page of the KeysetPaginator. It offers the same interface as the page of the django-paginator,
+    which is used by the grid, and additionally the cursors to the next and previous page.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self.__has_next = has_next
+        self.__has_previous = has_previous
+
+        # The cursors pointing to the pages next to this one
+        self.next_cursor = paginator.encode_cursor(object_list[-1], 'next') if has_next else None
+        self.previous_cursor = paginator.encode_cursor(object_list[0], 'prev') if has_previous else None
+
+    def has_next(self):
+        return self.__has_next
+
+    def has_previous(self):
+        return self.__has_previous
+
+
+class KeysetPaginator(object):
+    """
+    Paginator that pages by the values of the ordering instead of an offset. The position within the
+    queryset is passed as an opaque cursor, which contains the values of the ordering-fields of the
+    first/last row of the current page. Fetching a page therefore only needs the rows of the page itself,
+    no matter how deep the page is. The ordering is always completed by the primary key, so it is unique.
+    The fields used for ordering must not be nullable.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=None):
+        """
+        @param queryset The queryset to page
+        @param per_page The amount of rows on each page
+        @param ordering List of tuples (lookup, ascending) the queryset is sorted by
+        @param count Callable returning the amount of rows (or None, if unknown). If not given, the rows are not counted
+        """
+        self.__queryset = queryset
+        self.per_page = per_page
+        self.__ordering = [o for o in ordering if o[0] != 'pk'] + [('pk', ordering[-1][1] if ordering else True)]
+        self.__count = count
+        self.__num_pages = None
+        self.__counted = False
+
+    def __get_num_pages(self):
+        """ Return the amount of pages or None, if the rows should not be counted """
+        if not self.__counted:
+            self.__counted = True
+            hits = self.__count() if self.__count else None
+            if hits != None:
+                self.__num_pages = (max(1, hits) + self.per_page - 1) // self.per_page
+        return self.__num_pages
+    num_pages = property(__get_num_pages)
+
+    def __signature(self):
+        """ The lookups of the ordering. A cursor is only valid for the ordering it was created with """
+        return [lookup for lookup, ascending in self.__ordering]
+
+    def __get_key(self, obj):
+        """ Extract the values of the ordering-fields from the object """
+        key = []
+        for lookup, ascending in self.__ordering:
+            value = obj
+            for name in lookup.split('__'):
+                value = getattr(value, name)
+            key.append(value.pk if isinstance(value, Model) else value)
+        return key
+
+    def encode_cursor(self, obj, direction):
+        """
+        Create an opaque cursor pointing after (next) or before (prev) the given object
+        @param obj The first or last object of a page
+        @param direction 'next' or 'prev'
+        @return urlsafe string
+        """
+        # The values are encoded losslessly (like the microseconds of datetimes), otherwise the seek might
+        # not move past rows sharing the truncated value
+        data = {'d': direction, 's': self.__signature(), 'k': [encode_typed(value) for value in self.__get_key(obj)]}
+        return base64.urlsafe_b64encode(simplejson.dumps(data))
+
+    def decode_cursor(self, cursor):
+        """
+        Decode a cursor created by encode_cursor
+        @return tuple (direction, key) or None, if the cursor is invalid or belongs to another ordering
+        """
+        try:
+            data = simplejson.loads(base64.urlsafe_b64decode(str(cursor)))
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('s') != self.__signature() or data.get('d') not in ('next', 'prev'):
+            return None
+        if len(data.get('k') or []) != len(self.__ordering):
+            return None
+        try:
+            return data['d'], [decode_typed(value) for value in data['k']]
+        except ValueError:
+            return None
+
+    def __seek(self, key, forward):
+        """
+        Create the Q-object that selects all rows after (forward) or before the given key. For the
+        ordering (a, b) this is (a > x) OR (a = x AND b > y).
+        """
+        condition = None
+        for i, (lookup, ascending) in enumerate(self.__ordering):
+            operator = 'gt' if ascending == forward else 'lt'
+            q = Q(**{'%s__%s' % (lookup, operator): key[i]})
+            for j in range(i):
+                q &= Q(**{self.__ordering[j][0]: key[j]})
+            condition = q if condition == None else condition | q
+        return condition
+
+    def __order_by(self, forward):
+        return ["%s%s" % ("" if ascending == forward else "-", lookup) for lookup, ascending in self.__ordering]
+
+    def page(self, number=1, cursor=None):
+        """
+        Return the page the cursor points to. If no (valid) cursor is given, the first page is returned.
+        @param number The number of the page. This is only used for displaying
+        @param cursor The cursor created by a previous page
+        @return KeysetPage
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded == None:
+            rows = list(self.__queryset.order_by(*self.__order_by(True))[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], 1, self, len(rows) > self.per_page, False)
+
+        direction, key = decoded
+        forward = (direction == 'next')
+        queryset = self.__queryset.filter(self.__seek(key, forward)).order_by(*self.__order_by(forward))
+        rows = list(queryset[:self.per_page + 1])
+        if not rows:
+            return self.page()
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return KeysetPage(rows, number, self, more, True)
+
+        # Paging backwards fetches the rows in reversed order
+        rows.reverse()
+        return KeysetPage(rows, max(1, number), self, True, more)
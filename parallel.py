@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the helper to run independent queries of a grid concurrently. The grid waits for the
+slowest query instead of the sum of all of them.
+"""
+
+# Lib-Imports
+import threading
+
+# Django imports
+from django.db import connections
+
+
+def _close_connections():
+    """ Close the database-connections of the current thread, which were opened by the task """
+    for connection in connections.all():
+        connection.close()
+
+
+def run_parallel(tasks, profile=None):
+    """
+    Run the callables concurrently and return their results in the same order. The first task is run on the
+    current thread, all others on their own threads, which close their database-connections once they are done.
+    Each thread uses a separate connection, so the tasks don't see changes of the current transaction,
+    that aren't committed yet. If a task fails, its exception is raised, once all tasks are finished.
+    @param tasks List of callables without arguments
+    @param profile The Profile recording the stages of the tasks or None. The queries of the other threads
+                   are counted on their own connections
+    @return list with the results of the tasks
+    """
+    results = [None] * len(tasks)
+    errors = [None] * len(tasks)
+
+    def run(nr, close):
+        if close and profile != None:
+            profile.start_thread()
+        try:
+            results[nr] = tasks[nr]()
+        except Exception as e:
+            errors[nr] = e
+        finally:
+            if close:
+                if profile != None:
+                    profile.finish_thread()
+                _close_connections()
+
+    threads = [threading.Thread(target=run, args=(nr, True)) for nr in range(1, len(tasks))]
+    for thread in threads:
+        thread.start()
+    if tasks:
+        run(0, False)
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error != None:
+            raise error
+    return results
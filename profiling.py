@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the instrumentation of the grid. If the setting `profile` is enabled, the grid measures
+the time, the queries and the rendered templates of each stage of a request (like the page-query or the
+rendering of the rows). The results are sent with the signal grid_profiled, can be added to the response
+as Server-Timing header and may be displayed below the grid.
+"""
+
+# Lib-Imports
+import threading
+import timeit
+
+# Django imports
+from django.db import connection
+from django.dispatch import Signal
+from django.template.base import Template
+
+
+# Sent once a profiled grid was rendered
+grid_profiled = Signal(providing_args=['grid', 'profile'])
+
+
+# The profile of the current thread, which counts the rendered templates
+_local = threading.local()
+_template_counter_installed = False
+_install_lock = threading.Lock()
+
+
+def _install_template_counter():
+    """
+    Wrap Template.render, so the templates rendered while a profile is active are counted. This is only
+    done once the first profile is created, so the templates are not affected as long as no grid is profiled.
+    """
+    global _template_counter_installed
+    with _install_lock:
+        if _template_counter_installed:
+            return
+        original = Template.render
+
+        def render(self, context):
+            profile = getattr(_local, 'profile', None)
+            if profile != None:
+                profile.count_template()
+            return original(self, context)
+
+        Template.render = render
+        _template_counter_installed = True
+
+
+class _Stage(object):
+    """ Context-manager measuring a single stage of a profile """
+
+    def __init__(self, profile, name):
+        self.__profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.__profile._enter(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__profile._exit(self)
+        return False
+
+
+class _NullStage(object):
+    """ The stage used, if profiling is disabled. It does nothing """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class NullProfile(object):
+    """ The profile of a grid without profiling. All methods are no-ops, so disabled profiling costs nothing """
+    stage_context = _NullStage()
+
+    def stage(self, name):
+        return self.stage_context
+
+    def wrap(self, name, func):
+        return func
+
+    def add(self, name, seconds):
+        pass
+
+    def start_thread(self):
+        pass
+
+    def finish_thread(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+class Profile(object):
+    """
+    The profile of a single request of a grid. Each stage records its time in ms, the amount of queries
+    and of rendered templates. Stages may be nested, each stage only records its own part, the nested
+    stages are subtracted. The queries are counted with the debug-cursor of the default connection,
+    which is enabled until the profile is finished.
+    Stages may also be measured on other threads (like the ones of parallel_queries), which have to call
+    start_thread and finish_thread. Each thread nests its own stages and counts the queries of its own
+    connection. Their time overlaps the stage of the thread waiting for them.
+    """
+
+    def __init__(self):
+        _install_template_counter()
+        self.stages = []
+        self.__threads = threading.local()
+        self.__debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        _local.profile = self
+
+    def stage(self, name):
+        """ Return a context-manager measuring the stage with the given name """
+        return _Stage(self, name)
+
+    def wrap(self, name, func):
+        """ Wrap the callable, so each call is measured as stage """
+        def wrapped(*args, **kw):
+            with self.stage(name):
+                return func(*args, **kw)
+        return wrapped
+
+    def add(self, name, seconds, queries=0, templates=0):
+        """ Add a stage, that was measured by the caller """
+        self.stages.append({'name': name, 'ms': seconds * 1000, 'queries': queries, 'templates': templates})
+
+    def count_template(self):
+        stack = self.__get_stack()
+        if stack:
+            stack[-1]['templates'] += 1
+
+    def __get_stack(self):
+        """ Return the stack of the open stages of the current thread """
+        stack = getattr(self.__threads, 'stack', None)
+        if stack == None:
+            stack = self.__threads.stack = []
+        return stack
+
+    def _enter(self, stage):
+        self.__get_stack().append({'stage': stage, 'start': timeit.default_timer(), 'queries': len(connection.queries),
+                                   'templates': 0, 'nested_seconds': 0, 'nested_queries': 0})
+
+    def _exit(self, stage):
+        stack = self.__get_stack()
+        entry = stack.pop()
+        seconds = timeit.default_timer() - entry['start']
+        queries = len(connection.queries) - entry['queries']
+        if stack:
+            parent = stack[-1]
+            parent['nested_seconds'] += seconds
+            parent['nested_queries'] += queries
+        self.add(stage.name, seconds - entry['nested_seconds'], queries - entry['nested_queries'], entry['templates'])
+
+    def start_thread(self):
+        """ Start counting the queries and templates of the current thread, which isn't the one of the request """
+        self.__threads.debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        _local.profile = self
+
+    def finish_thread(self):
+        """ Stop counting the queries and templates of the current thread (see start_thread) """
+        connection.use_debug_cursor = self.__threads.debug_cursor
+        if getattr(_local, 'profile', None) is self:
+            _local.profile = None
+
+    def finish(self):
+        """ Stop counting the queries and templates """
+        connection.use_debug_cursor = self.__debug_cursor
+        if getattr(_local, 'profile', None) is self:
+            _local.profile = None
+
+    def get_totals(self):
+        """ Return the summed up time, queries and templates of all stages """
+        return {
+            'ms': sum(s['ms'] for s in self.stages),
+            'queries': sum(s['queries'] for s in self.stages),
+            'templates': sum(s['templates'] for s in self.stages),
+        }
+
+    def server_timing(self, prefix=""):
+        """
+        Return the stages in the format of the Server-Timing header (like `grid-page;dur=1.25`)
+        @param prefix A prefix for the names of the stages (like the id of the grid)
+        """
+        return ", ".join(['%s%s;dur=%.2f' % (prefix, s['name'], s['ms']) for s in self.stages])
+
+
+def add_server_timing(response, *grids):
+    """
+    Add the stages of the profiled grids to the Server-Timing header of the response
+    @param response The HttpResponse
+    @param grids The rendered grids. Grids without profiling are skipped
+    @return The response
+    """
+    timings = [grid.get_profile().server_timing("%s-" % grid.get_id()) for grid in grids if grid.get_profile() != None]
+    timings = [t for t in timings if t]
+    if timings:
+        existing = response.get('Server-Timing') if response.has_header('Server-Timing') else None
+        response['Server-Timing'] = ", ".join(([existing] if existing else []) + timings)
+    return response
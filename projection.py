@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the projection of the queryset to the fields that are needed to display the columns of a grid
+"""
+
+# Django imports
+from django.db.models.fields import FieldDoesNotExist
+
+
+class Projection(object):
+    """
+    The projection describes, which fields and relations of a model are needed to display a set of columns.
+    The db_field of each column is resolved along the relations of the model. Forward foreign-keys and
+    one-to-one-relations are joined (select_related), other relations (many-to-many or reverse foreign-keys)
+    are fetched with one query for the entire page (prefetch_related). If all fields could be resolved,
+    the queryset can also be restricted to only fetch the required fields.
+    """
+
+    def __init__(self, model, columns):
+        """
+        @param model The model the queryset is based on
+        @param columns The columns whose data should be fetched
+        """
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.fields = set([model._meta.pk.name])
+
+        # If any field can't be resolved (like a property), all fields have to be fetched
+        self.complete = True
+
+        for column in columns:
+            for lookup in self.__lookups(column):
+                self.__resolve(model, lookup.split('__'))
+
+        # The joined relations are needed themselves, otherwise only() fails
+        for path in self.select_related:
+            self.fields.add(path)
+
+    def __lookups(self, column):
+        """ Return the lookups used by the column to fetch and display its data """
+        lookups = [column.get_lookup()]
+        obj_lookup = column.get_obj_field().replace('.', '__')
+        if obj_lookup != lookups[0]:
+            lookups.append(obj_lookup)
+        return lookups
+
+    def __resolve(self, model, names):
+        """
+        Follow the names along the relations of the model and collect the needed fields and relations
+        @param model The model to start at
+        @param names The parts of the lookup
+        """
+        path = []
+        for i, name in enumerate(names):
+            try:
+                field, related_model, direct, m2m = model._meta.get_field_by_name(name)
+            except FieldDoesNotExist:
+                self.complete = False
+                return
+            path.append(name if direct else field.get_accessor_name())
+            is_last = (i == len(names) - 1)
+
+            # A reverse one-to-one-relation returns a single object and can be joined as well
+            if not direct and not m2m and field.field.unique:
+                self.select_related.add("__".join(path))
+                if is_last:
+                    return
+                model = field.model
+                continue
+
+            # Many-to-many and reverse relations return multiple objects, so they are prefetched
+            if m2m or not direct:
+                self.prefetch_related.add("__".join(path))
+                self.complete = False
+                return
+
+            # The field is a forward-relation, which is joined
+            if getattr(field, 'rel', None) != None:
+                self.select_related.add("__".join(path))
+                if is_last:
+                    return
+                model = field.rel.to
+                continue
+
+            # A plain field must be the end of the lookup
+            if not is_last:
+                self.complete = False
+                return
+            self.fields.add("__".join(path))
+
+    def apply(self, queryset, only=False):
+        """
+        Apply the projection to the queryset
+        @param queryset The queryset to adapt
+        @param only If True (and all fields are known), the queryset will only fetch the required fields
+        @return The adapted queryset
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch_related))
+        if only and self.complete:
+            queryset = queryset.only(*sorted(self.fields))
+        return queryset
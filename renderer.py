@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+# Django imports
+from django.template.context import RequestContext
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+
+class RowRenderer(object):
+    """
+    This renders all rows of a page in a single pass. Instead of rendering the content-template of the columns
+    for each cell, the template is rendered only once with a marker as content. The output is then split into
+    the part before and after the content, which are simply concatenated with the data of each cell.
+    If the template doesn't contain the content exactly once, the compiled template is rendered for each cell,
+    but the context is still only created once.
+    The cells of columns with a compiled formatter (like numbers and dates) are formatted column by column
+    with the formatter, without calling the cell-renderer of the column.
+    """
+
+    # The marker used to find the position of the content within the rendered template
+    MARKER = u"__grid_cell_content__"
+
+    def __init__(self, request, template_name, columns):
+        """
+        @param request The request that issued the render
+        @param template_name The name of the template used to render each cell
+        @param columns The (bound) columns of the grid. Only the visible ones are rendered
+        """
+        self.__template = get_template(template_name)
+        self.__context = RequestContext(request, {'content': self.MARKER})
+        self.__cell_renderers = [c.get_cell_renderer() for c in columns if c.is_visible()]
+        
+        # The getter and formatter of each visible column, or None if the cells are rendered by the cell-renderer
+        self.__formatters = [(c.get_value, c.get_formatter()) if c.get_formatter() != None else None 
+                             for c in columns if c.is_visible()]
+
+        # Split the rendered template, so the cells can be rendered by concatenation
+        parts = self.__template.render(self.__context).split(self.MARKER)
+        self.__wrapper = parts if len(parts) == 2 else None
+
+    def __render_cell(self, content):
+        """ Render a single cell with the compiled template. This is only used, if the template couldn't be split """
+        self.__context.push()
+        try:
+            self.__context['content'] = mark_safe(content)
+            return self.__template.render(self.__context)
+        finally:
+            self.__context.pop()
+
+    def render(self, rows):
+        """
+        Render all rows. The contents of the cells are created column by column, afterwards they are
+        joined to the rows.
+        @param rows Iterable with the objects of the rows
+        @return list of dicts with the primary key (id) and the html (content) of each row
+        """
+        rows = list(rows)
+        contents = []
+        for render, formatter in zip(self.__cell_renderers, self.__formatters):
+            if formatter != None:
+                get_value, format = formatter
+                contents.append([format(get_value(row)) for row in rows])
+            else:
+                contents.append([render(row) for row in rows])
+        
+        if self.__wrapper:
+            before, after = self.__wrapper
+            wrap = lambda content: u"%s%s%s" % (before, content, after)
+        else:
+            wrap = self.__render_cell
+        return [{'id': row.pk, 'content': mark_safe(u"".join([wrap(cells[nr]) for cells in contents]))} 
+                for nr, row in enumerate(rows)]
@@ -1,29 +1,64 @@
+# Django imports
+from django.conf import settings as project_settings
+
+
 class GridResourceHandler(object):
     """
     This class is used to fetch the urls to display resources, like images, css and js
-    It is initialized with a static_path, which is the base-url to the static files.
-    
+    It is initialized with a static_path, which is the base-url to the static files. Alternatively the urls
+    are resolved by a storage of the staticfiles-app, which supports hashed filenames (like the
+    CachedStaticFilesStorage), so the resources can be cached by the browser (or a CDN) forever.
+    Each url is only built once and then memoized.
     """
-    
-    def __init__(self, static_path=None):
-        """ 
+
+    def __init__(self, static_path=None, storage=None):
+        """
         Initialize the mixin. The `static_path` is the baselocation to all
-        images 
+        images
+        @param storage The storage resolving the urls (like staticfiles_storage). If given, static_path is not used
         """
         self.__static_path = static_path
-        
-    
+        self.__storage = storage
+        self.__urls = {}
+
+
     def __resource(self, resource_type, name):
         """ This will return the absolute url to the resource. The resource_type
         may be css, js, img and the name specifies the name to use """
-        return u"%s/%s/grid_widget/%s" % (self.__static_path, resource_type, name)
-        
+        key = (resource_type, name)
+        url = self.__urls.get(key)
+        if url == None:
+            path = u"%s/grid_widget/%s" % (resource_type, name)
+            url = self.__storage.url(path) if self.__storage != None else u"%s/%s" % (self.__static_path, path)
+            self.__urls[key] = url
+        return url
+
     def css(self, name):
         return self.__resource("css", name)
-    
+
     def js(self, name):
         return self.__resource("js", name)
-    
+
     def icon(self, name, deactivated=False):
         img_name = u"%s%s" % (name, "" if not deactivated else "_deactivated")
-        return self.__resource("img", name)
\ No newline at end of file
+        return self.__resource("img", img_name)
+
+
+# The handler shared by all grids and columns
+_shared_handler = None
+
+
+def get_resource_handler():
+    """
+    Return the resource-handler shared by all grids and columns. It is created on first use. If the project-setting
+    GRID_WIDGET_STATIC_STORAGE is True, the urls are resolved by the staticfiles_storage of the project (which
+    may use hashed filenames), otherwise they are built from STATIC_URL.
+    """
+    global _shared_handler
+    if _shared_handler == None:
+        if getattr(project_settings, 'GRID_WIDGET_STATIC_STORAGE', False):
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            _shared_handler = GridResourceHandler(storage=staticfiles_storage)
+        else:
+            _shared_handler = GridResourceHandler(project_settings.STATIC_URL)
+    return _shared_handler
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the backends for the quick-search of the grid. A backend restricts the queryset to the
+rows matching the entered text in any of the searched columns and may rank them. The backends using a
+search-index of the database offer `index_sql`, which returns the statements to create the index.
+"""
+
+# Lib-Imports
+import re
+
+# Django imports
+from django.db.models import Q
+from django.utils.encoding import force_unicode
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+
+class SearchBackend(object):
+    """
+    Base-class for all search-backends. A backend is configured as the setting `search_backend` of the grid.
+    """
+
+    def search(self, queryset, lookups, text):
+        """
+        Restrict the queryset to the rows matching the text
+        @param queryset The queryset to search in
+        @param lookups The lookups of the searched columns
+        @param text The text entered in the search-box
+        @return The restricted queryset. If the backend ranks the rows, the queryset is ordered by the rank.
+        """
+        raise NotImplementedError()
+
+    def get_terms(self, text):
+        """ Split the text into the terms that are searched for """
+        return [t for t in re.split(r"\s+", text.strip()) if t]
+
+
+class ContainsSearch(SearchBackend):
+    """
+    Search each term with `icontains` in the columns. This works on any database, but can't use
+    an index, so it should only be used for small tables
+    """
+
+    def search(self, queryset, lookups, text):
+        for term in self.get_terms(text):
+            condition = Q()
+            for lookup in lookups:
+                condition |= Q(**{"%s__icontains" % lookup: term})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class PostgresSearch(SearchBackend):
+    """
+    Full-text search of postgres. The columns are combined to a single tsvector, which is matched against
+    the entered terms and used to rank the rows. To be fast, the table needs a GIN-index on exactly the
+    same expression, which is returned by index_sql.
+    If trigram is True, the columns are instead searched with ILIKE, which uses a trigram-index (pg_trgm)
+    and also finds parts of words. Trigram-searches are not ranked.
+    All searched columns must be fields of the model itself.
+    """
+
+    def __init__(self, config='simple', trigram=False):
+        """
+        @param config The text-search-configuration of postgres (like simple, english or german)
+        @param trigram Search with ILIKE using a trigram-index instead of the full-text-search
+        """
+        self.__config = config
+        self.__trigram = trigram
+
+    def __columns(self, queryset, lookups):
+        """ Return the quoted names of the database-columns of the lookups """
+        opts = queryset.model._meta
+        return ['"%s"."%s"' % (opts.db_table, opts.get_field(lookup).column) for lookup in lookups]
+
+    def __vector(self, columns):
+        document = " || ' ' || ".join(["coalesce(%s::text, '')" % c for c in columns])
+        return "to_tsvector('%s', %s)" % (self.__config, document)
+
+    def search(self, queryset, lookups, text):
+        columns = self.__columns(queryset, lookups)
+
+        if self.__trigram:
+            for term in self.get_terms(text):
+                where = "(%s)" % " OR ".join(["%s ILIKE %%s" % c for c in columns])
+                pattern = "%%%s%%" % term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                queryset = queryset.extra(where=[where], params=[pattern] * len(columns))
+            return queryset
+
+        vector = self.__vector(columns)
+        query = "plainto_tsquery('%s', %%s)" % self.__config
+        return queryset.extra(
+            select={'search_rank': "ts_rank(%s, %s)" % (vector, query)},
+            select_params=[text],
+            where=["%s @@ %s" % (vector, query)],
+            params=[text],
+            order_by=['-search_rank'])
+
+    def index_sql(self, model, lookups):
+        """
+        Return the sql to create the index used by this backend
+        @param model The model of the grid
+        @param lookups The lookups of the searched columns
+        @return String containing the sql-statement(s)
+        """
+        opts = model._meta
+        if self.__trigram:
+            statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm;"]
+            for column in [opts.get_field(lookup).column for lookup in lookups]:
+                statements.append('CREATE INDEX "%s_%s_trgm" ON "%s" USING gin ("%s" gin_trgm_ops);' % (opts.db_table, column,
+                                                                                                  opts.db_table, column))
+            return "\n".join(statements)
+        vector = self.__vector(['"%s"' % opts.get_field(lookup).column for lookup in lookups])
+        return 'CREATE INDEX "%s_search" ON "%s" USING gin ((%s));' % (opts.db_table, opts.db_table, vector)
+
+
+class SQLiteFTS5Search(SearchBackend):
+    """
+    Full-text search with the FTS5-extension of sqlite, which is useful for local testing. The searched
+    columns are indexed in a separate fts5-table, that is kept in sync by triggers (see index_sql). The rows
+    are ranked by bm25. All searched columns must be fields of the model itself.
+    """
+
+    def __fts_table(self, model):
+        return "%s_fts" % model._meta.db_table
+
+    def __quote(self, term):
+        """ Quote a term for the MATCH-expression, so it is searched as prefix """
+        return '"%s"*' % term.replace('"', '""')
+
+    def search(self, queryset, lookups, text):
+        terms = self.get_terms(text)
+        if not terms:
+            return queryset
+
+        opts = queryset.model._meta
+        fts_table = self.__fts_table(queryset.model)
+        match = " ".join([self.__quote(t) for t in terms])
+        pk = '"%s"."%s"' % (opts.db_table, opts.pk.column)
+        return queryset.extra(
+            select={'search_rank': 'SELECT -bm25("%s") FROM "%s" WHERE "%s" MATCH %%s AND rowid = %s' % (fts_table, fts_table, fts_table, pk)},
+            select_params=[match],
+            where=['%s IN (SELECT rowid FROM "%s" WHERE "%s" MATCH %%s)' % (pk, fts_table, fts_table)],
+            params=[match],
+            order_by=['-search_rank'])
+
+    def index_sql(self, model, lookups):
+        """
+        Return the sql to create the fts5-table and the triggers keeping it in sync with the table of the model
+        @param model The model of the grid
+        @param lookups The lookups of the searched columns
+        @return String containing the sql-statements
+        """
+        opts = model._meta
+        table, fts_table, pk = opts.db_table, self.__fts_table(model), opts.pk.column
+        columns = [opts.get_field(lookup).column for lookup in lookups]
+        names = ", ".join(['"%s"' % c for c in columns])
+        new_values = ", ".join(['new."%s"' % c for c in columns])
+        old_values = ", ".join(['old."%s"' % c for c in columns])
+        return "\n".join([
+            'CREATE VIRTUAL TABLE "%s" USING fts5(%s, content="%s", content_rowid="%s");' % (fts_table, names, table, pk),
+            'INSERT INTO "%s"(rowid, %s) SELECT "%s", %s FROM "%s";' % (fts_table, names, pk, names, table),
+            'CREATE TRIGGER "%s_ai" AFTER INSERT ON "%s" BEGIN INSERT INTO "%s"(rowid, %s) VALUES (new."%s", %s); END;'
+                % (fts_table, table, fts_table, names, pk, new_values),
+            'CREATE TRIGGER "%s_ad" AFTER DELETE ON "%s" BEGIN INSERT INTO "%s"("%s", rowid, %s) VALUES (\'delete\', old."%s", %s); END;'
+                % (fts_table, table, fts_table, fts_table, names, pk, old_values),
+            'CREATE TRIGGER "%s_au" AFTER UPDATE ON "%s" BEGIN INSERT INTO "%s"("%s", rowid, %s) VALUES (\'delete\', old."%s", %s); '
+            'INSERT INTO "%s"(rowid, %s) VALUES (new."%s", %s); END;'
+                % (fts_table, table, fts_table, fts_table, names, pk, old_values, fts_table, names, pk, new_values),
+        ])
+
+
+def highlight(renderer, terms):
+    """
+    Wrap a cell-renderer, so the terms are highlighted with <mark> in the rendered content.
+    The terms are searched in the text of the content, which is escaped piece by piece afterwards, so
+    terms like `amp` don't match within the entities.
+    @param renderer The cell-renderer of the column
+    @param terms The searched terms
+    @return A new cell-renderer
+    """
+    if not terms:
+        return renderer
+    pattern = re.compile(u"(%s)" % u"|".join([re.escape(t) for t in terms]), re.IGNORECASE | re.UNICODE)
+
+    def render(row):
+        # Every second part is a match
+        parts = pattern.split(force_unicode(renderer(row)))
+        return mark_safe(u"".join([u"<mark>%s</mark>" % escape(part) if nr % 2 else escape(part)
+                                   for nr, part in enumerate(parts)]))
+    return render
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the helpers to serialize the data of the grid as json. The DjangoJSONEncoder can't be used
+with simplejson (it is based on the encoder of the json-module and rejects the arguments of simplejson),
+so the values simplejson can't encode itself are converted by json_default.
+"""
+
+# Lib-Imports
+import datetime
+from decimal import Decimal, InvalidOperation
+
+# Django imports
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+from django.utils.encoding import force_unicode
+from django.utils.functional import Promise
+
+
+def json_default(value):
+    """
+    Convert the values simplejson can't encode (passed as `default` to simplejson.dumps). Dates and times are
+    converted to their isoformat (including the microseconds), decimals and lazy translations to strings.
+    """
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return unicode(value)
+    if isinstance(value, Promise):
+        return force_unicode(value)
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+# The types of values, which can be sent as json (the dates and decimals are converted by json_default)
+_JSON_TYPES = (type(None), bool, int, long, float, basestring, datetime.date, datetime.time, Decimal)
+
+
+def json_value(value):
+    """
+    Return the value, if it can be sent as json. All other values (like related objects) are sent as
+    their text, like in the html of the cell.
+    """
+    return value if isinstance(value, _JSON_TYPES) else force_unicode(value)
+
+
+# The types, which are tagged by encode_typed, so decode_typed can restore them
+_TYPES = (
+    ('dt', datetime.datetime, parse_datetime),
+    ('d', datetime.date, parse_date),
+    ('t', datetime.time, parse_time),
+    ('n', Decimal, Decimal),
+)
+
+
+def encode_typed(value):
+    """
+    Encode a value losslessly as json-compatible value. Dates, times and decimals are encoded as list
+    [tag, string], all other values are returned as they are. This is used for values, that are sent back
+    to the database (like the keys of a cursor).
+    """
+    for tag, type, parse in _TYPES:
+        if isinstance(value, type):
+            return [tag, value.isoformat() if tag != 'n' else unicode(value)]
+    return value
+
+
+def decode_typed(value):
+    """
+    Restore a value encoded by encode_typed
+    @throws ValueError If the value is tagged, but invalid
+    """
+    if isinstance(value, list) and len(value) == 2:
+        for tag, type, parse in _TYPES:
+            if value[0] == tag:
+                try:
+                    parsed = parse(value[1])
+                except (InvalidOperation, TypeError):
+                    parsed = None
+                if parsed == None:
+                    raise ValueError("Invalid value %r" % value)
+                return parsed
+    return value
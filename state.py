@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the functions to handle the state of a grid, which is sent by the client as `grid_data`
+or encoded as `grid_state` (see encode_state)
+"""
+
+# Lib-Imports
+import base64
+import hashlib
+import simplejson
+import zlib
+
+# Grid-Imports
+from cache import get_cache
+from exceptions import InvalidStateException
+from serialization import json_default
+
+
+# The keys of the state, that only identify the request and don't change the rendered view
+REQUEST_KEYS = ('client', 'version')
+
+# The keys of the state, that select the displayed part of the filtered rows
+VIEW_KEYS = ('page', 'cursor', 'sorting', 'format', 'columns')
+
+# The keys of the state, that only select the kind of response and are left out of links to a view
+RESPONSE_KEYS = ('format', 'columns', 'window')
+
+# The version of the encoded states. It is the first character of each encoded state, followed by the mode
+# (j for json, z for compressed json)
+STATE_CODEC_VERSION = '1'
+
+# The maximum size of a decoded state in bytes
+MAX_STATE_SIZE = 64 * 1024
+
+
+def normalize_state(parameters):
+    """
+    Normalize the state sent by the client, so equal states always result in the same dict. The filters are
+    sorted, the page defaults to 1 and empty values and the version of the request are removed. All other keys (like the extra callback-params)
+    are kept as they are.
+    @param parameters The dict parsed from grid_data
+    @return dict The normalized state
+    """
+    state = dict((k, v) for k, v in parameters.items() if v not in (None, {}, []) and k not in REQUEST_KEYS)
+    state.pop('filter', None)
+
+    try:
+        state['page'] = max(1, int(parameters.get('page') or 1))
+    except (TypeError, ValueError):
+        state['page'] = 1
+
+    filters = []
+    for f in parameters.get('filter') or []:
+        filters.append(dict((k, v) for k, v in f.items() if v != None))
+    if filters:
+        state['filter'] = sorted(filters, key=lambda f: simplejson.dumps(f, sort_keys=True))
+
+    return state
+
+
+def filter_state(parameters):
+    """
+    Return the part of the normalized state, that determines the filtered rows (the filters, the search and
+    the extra callback-params). Data computed from all filtered rows (like the facets) can be cached with it.
+    @param parameters The dict parsed from grid_data
+    @return dict The normalized filter-state
+    """
+    return dict((k, v) for k, v in normalize_state(parameters).items() if k not in VIEW_KEYS)
+
+
+class StateVersions(object):
+    """
+    Keeps the latest state-version sent by each client of a grid. Each grid in the browser sends a random id
+    (client) and a version, that is increased with every change of the state. A request is stale, once the same
+    client sent a newer version, because the browser will ignore its response. The grid then skips the
+    remaining queries and rendering. It is configured as the setting `state_versions` of the grid.
+    The versions are stored in a django cache-backend, which must be shared by all processes to be effective.
+    """
+
+    def __init__(self, timeout=300, cache='default'):
+        """
+        @param timeout The time in seconds the version of a client is kept
+        @param cache The alias of the django cache-backend to use
+        """
+        self.__timeout = timeout
+        self.__cache = cache
+
+    def __key(self, grid_id, client):
+        return "grid:%s:version:%s" % (grid_id, client)
+
+    def register(self, grid_id, client, version):
+        """ Store the version sent by the client, unless a newer one is already known """
+        cache = get_cache(self.__cache)
+        key = self.__key(grid_id, client)
+        if cache.get(key, 0) < version:
+            cache.set(key, version, self.__timeout)
+
+    def is_stale(self, grid_id, client, version):
+        """ Check if the client already sent a newer version """
+        return get_cache(self.__cache).get(self.__key(grid_id, client), 0) > version
+
+
+def get_request_version(parameters):
+    """
+    Return the client-id and the version sent with the state or None, if they are missing or invalid
+    @param parameters The dict parsed from grid_data
+    @return tuple (client, version) or None
+    """
+    client = parameters.get('client')
+    try:
+        version = int(parameters.get('version'))
+    except (TypeError, ValueError):
+        return None
+    if not client or not isinstance(client, basestring):
+        return None
+    return (client[:64], version)
+
+
+def link_state(parameters):
+    """
+    Return the part of the normalized state, that is needed to restore the view (like from a link). The keys
+    selecting the kind of response (RESPONSE_KEYS) are left out.
+    @param parameters The dict parsed from grid_data
+    @return dict The normalized state
+    """
+    return dict((k, v) for k, v in normalize_state(parameters).items() if k not in RESPONSE_KEYS)
+
+
+def encode_state(parameters):
+    """
+    Encode the state as compact, url-safe string (like `1z.eJyrVipILMpM...`), which can be sent as GET-parameter
+    `grid_state`. The state is normalized first, so equal states always result in the same string. The json is
+    compressed, if that makes it shorter.
+    @param parameters The dict parsed from grid_data
+    @return String The encoded state
+    """
+    data = simplejson.dumps(normalize_state(parameters), sort_keys=True, separators=(',', ':'), default=json_default)
+    data = data.encode('utf-8') if isinstance(data, unicode) else data
+    compressed = zlib.compress(data, 9)
+    mode, payload = ('z', compressed) if len(compressed) < len(data) else ('j', data)
+    return "%s%s.%s" % (STATE_CODEC_VERSION, mode, base64.urlsafe_b64encode(payload).rstrip('='))
+
+
+def is_encoded_state(value):
+    """ Check if the value is an encoded state (and not the id of a snapshot) """
+    return '.' in value
+
+
+def decode_state(value):
+    """
+    Decode a state encoded by encode_state (or by the grid in the browser)
+    @param value The encoded state
+    @return dict The state
+    @throws InvalidStateException If the state can't be decoded
+    """
+    try:
+        header, payload = value.split('.', 1)
+        if header[:-1] != STATE_CODEC_VERSION or header[-1:] not in ('j', 'z'):
+            raise ValueError("Unknown version %s" % header)
+        data = base64.urlsafe_b64decode(str(payload) + '=' * (-len(payload) % 4))
+        if header[-1] == 'z':
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(data, MAX_STATE_SIZE)
+            if decompressor.unconsumed_tail:
+                raise ValueError("State too large")
+        state = simplejson.loads(data.decode('utf-8'))
+    except (ValueError, TypeError, UnicodeError, zlib.error):
+        raise InvalidStateException(u"Ungültiger Zustand")
+    if not isinstance(state, dict):
+        raise InvalidStateException(u"Ungültiger Zustand")
+    return state
+
+
+def state_etag(grid, parameters, version):
+    """
+    Return the ETag of the view of the grid with the given state
+    @param grid The grid that is rendered
+    @param parameters The dict parsed from grid_data
+    @param version The version of the data (see the setting etag_version)
+    @return String The quoted ETag
+    """
+    grid_class = type(grid)
+    data = simplejson.dumps([grid_class.__module__, grid_class.__name__, grid.get_id(), encode_state(parameters), version],
+                            default=json_default)
+    return '"%s"' % hashlib.md5(data.encode('utf-8') if isinstance(data, unicode) else data).hexdigest()
+
+
+class StateSnapshots(object):
+    """
+    Stores the states of the views of a grid under short ids, so a link to a view doesn't have to contain the
+    whole state. It is configured as the setting `state_snapshots` of the grid. The id is derived from the
+    state, so equal states share the same snapshot. The snapshots are stored in a django cache-backend, which
+    should be persistent (like the database-cache), otherwise links break once their snapshot is dropped.
+    """
+
+    def __init__(self, timeout=30 * 24 * 3600, cache='default', length=12):
+        """
+        @param timeout The time in seconds a snapshot is kept after it was created
+        @param cache The alias of the django cache-backend to use
+        @param length The length of the ids
+        """
+        self.__timeout = timeout
+        self.__cache = cache
+        self.__length = length
+
+    def __key(self, grid_id, state_id):
+        return "grid:%s:snapshot:%s" % (grid_id, state_id)
+
+    def save(self, grid_id, parameters):
+        """
+        Store the state and return its id. An existing snapshot of the same state is kept
+        @param grid_id The id of the grid
+        @param parameters The dict parsed from grid_data
+        @return String The id of the snapshot
+        """
+        encoded = encode_state(link_state(parameters))
+        state_id = base64.urlsafe_b64encode(hashlib.sha1(encoded).digest())[:self.__length]
+        get_cache(self.__cache).add(self.__key(grid_id, state_id), encoded, self.__timeout)
+        return state_id
+
+    def load(self, grid_id, state_id):
+        """ Return the encoded state stored with the id or None, if the snapshot doesn't exist """
+        return get_cache(self.__cache).get(self.__key(grid_id, state_id[:self.__length]))
@@ -180,11 +180,38 @@ var Grid = (function() {
     /** Initialize a new grid. Options contains the settings */
     function Grid(options) {
         console.assert(options.id && options.url);
+        var self = this;
         
         // read options
         this.id = options.id;
         this.url = options.url;
         this.error_handler = options.error_handler || null;
+        this.client_rendering = options.client_rendering || false;
+        this.infinite_scroll = options.infinite_scroll || false;
+        this.get_requests = options.get_requests || false;
+        
+        // the id of the snapshot of the loaded view, if the server stores snapshots (see state_link)
+        this.state_id = null;
+        
+        // the selected rows, on which the bulk-actions are run. If all is set, all rows matching the filters
+        // are selected except the ids, otherwise only the ids
+        this.action_url = options.action_url || null;
+        this.selection = {'all': false, 'ids': {}};
+        
+        // the rows loaded while scrolling (see init_scroll)
+        this.scroll = null;
+        
+        // the description of the columns, which is requested with the first json-response
+        this.columns = null;
+        
+        // the state of the requests. Each reload increases the version, which is sent with the request, so
+        // the server can drop superseded requests and older responses are ignored. The client-id distinguishes
+        // this grid from the same grid in other windows
+        this.client = Math.random().toString(36).substr(2, 10);
+        this.version = 0;
+        this.xhr = null;
+        this.xhr_data = null;
+        this.reload_timer = null;
         
         // find elements
         this.$grid = $("#grid_" + this.id);
@@ -194,34 +221,389 @@ var Grid = (function() {
         // extract extra callback-params
         this.extra_callback_params = options.extra_callback_params || {};
         
+        // the state of the grid, which is sent with each request
+        this.page = 1;
+        this.cursor = null;
+        this.sorting = {};
+        this.filter = {};
+        this.filterNr = 0;
+        this.search_text = "";
+        $.each(options.preset_filter || [], function(i, f) {
+            self.addFilter(f.column, f.values, f.mode, false);
+        });
+        
+        // the state restored from a link (see state_link)
+        if(options.state)
+            this.restore(options.state);
+        
+        // the search-box is placed outside of the grid, so it isn't replaced when reloading
+        if(options.search) {
+            var $search = $("#grid_" + this.id + "_search");
+            $search.keyup(function(event) {
+                self.search($search.val(), event.keyCode == 13 ? 0 : Grid.INPUT_DELAY);
+            });
+            $search.change(function() {
+                self.search($search.val(), 0);
+            });
+        }
+        
+        // the checkboxes of the SelectColumn and the one selecting all rows
+        this.$grid.on("change", ".grid_select", function() {
+            self.select($(this).val(), $(this).prop("checked"));
+        });
+        this.$grid.on("change", ".grid_select_all", function() {
+            self.selectAll($(this).prop("checked"));
+        });
+        
+        grids[this.id] = this;
         this.debug("initialized");
         
         // initial reloading
         this.reload();
     }
 
+    /** The time in ms the reload is delayed after a key was pressed, so typing doesn't issue a request per key */
+    Grid.INPUT_DELAY = 300;
+    
+    /** The amount of rows kept in the DOM above and below the visible area while scrolling */
+    Grid.SCROLL_MARGIN = 10;
+    
+    /** 
+     * Encode the state as url-safe string, which is sent as `grid_state` with GET-requests and decoded 
+     * by state.decode_state on the server
+     */
+    Grid.encode_state = function(params) {
+        var data = btoa(unescape(encodeURIComponent(JSON.stringify(params))));
+        return "1j." + data.replace(/\+/g, "-").replace(/\//g, "_").replace(/=+$/, "");
+    }
+    
     /** Print a debug-message to the console */
     Grid.prototype.debug = function(msg) {
         console.log("Grid `" + this.id + "`: " + msg);
     }
     
+    /**
+     * Load the specified page. If the grid uses keyset-pagination, the cursor
+     * rendered with the paginator must be passed, otherwise it is null
+     * @param number The number of the page
+     * @param cursor The opaque cursor pointing to the page
+     */
+    Grid.prototype.toPage = function(number, cursor) {
+        this.page = number;
+        this.cursor = cursor || null;
+        this.reload(true);
+    }
+    
+    /**
+     * Change the sorting. This will always return to the first page
+     * @param column The id of the column to sort
+     * @param direction 1 for ascending, -1 for descending
+     */
+    Grid.prototype.sort = function(column, direction) {
+        this.sorting = {'column': column, 'direction': direction};
+        this.page = 1;
+        this.cursor = null;
+        this.reload(true);
+    }
+    
+    /**
+     * Sort the column ascending, or descending if it already is sorted ascending
+     * @param column The id of the column to sort
+     */
+    Grid.prototype.toggleSort = function(column) {
+        var ascending = (this.sorting.column == column && this.sorting.direction == 1);
+        this.sort(column, ascending ? -1 : 1);
+    }
+    
+    /** Add a new filter to the column. The grid is reloaded, unless update is false */
+    Grid.prototype.addFilter = function(column, values, mode, update) {
+        // only the mode `ist leer` (0) needs no value
+        if(values == "" && mode != "0")
+            return;
+        while(this.filter[this.filterNr])
+            this.filterNr++;
+        this.filter[this.filterNr] = {'nr': this.filterNr, 'id': column, 'values': values, 'mode': mode};
+        
+        if(update != false) {
+            this.page = 1;
+            this.cursor = null;
+            this.reload();
+        }
+    }
+    
+    /** Remove the filter with the given nr */
+    Grid.prototype.removeFilter = function(nr) {
+        delete(this.filter[nr]);
+        this.page = 1;
+        this.cursor = null;
+        this.reload();
+    }
+    
+    /**
+     * Search the text in the search-columns of the grid. An empty text ends the search
+     * @param text The searched text
+     * @param delay The time in ms the reload is delayed (see reload)
+     */
+    Grid.prototype.search = function(text, delay) {
+        text = $.trim(text || "");
+        if(text == this.search_text)
+            return;
+        this.search_text = text;
+        this.page = 1;
+        this.cursor = null;
+        this.reload(true, delay);
+    }
+    
+    /** Replace the page, sorting, filters and search by the given state (without reloading) */
+    Grid.prototype.restore = function(state) {
+        var self = this;
+        this.page = state.page || 1;
+        this.cursor = state.cursor || null;
+        this.sorting = state.sorting || {};
+        this.filter = {};
+        this.filterNr = 0;
+        $.each(state.filter || [], function(i, f) {
+            self.addFilter(f.id, f.values || [], f.mode, false);
+        });
+        this.search_text = state.search || "";
+        $("#grid_" + this.id + "_search").val(this.search_text);
+    }
+    
+    /**
+     * Return a link to the current page, which restores the state of the grid. The link contains the id
+     * of the snapshot of the state, if the server stores snapshots, otherwise the encoded state
+     */
+    Grid.prototype.state_link = function() {
+        var value = (!this.xhr && this.state_id) || Grid.encode_state(this.get_params());
+        var search = window.location.search.replace(new RegExp("([?&])" + this.id + "_state=[^&]*&?"), "$1").replace(/[?&]$/, "");
+        return window.location.pathname + search + (search ? "&" : "?") + this.id + "_state=" + value;
+    }
+    
+    /** Select or deselect the row with the given primary key */
+    Grid.prototype.select = function(id, selected) {
+        if(selected != this.selection.all)
+            this.selection.ids[id] = true;
+        else
+            delete(this.selection.ids[id]);
+    }
+    
+    /** Select all rows matching the filters (including the ones on other pages) or clear the selection */
+    Grid.prototype.selectAll = function(selected) {
+        this.selection = {'all': selected, 'ids': {}};
+        this.update_selection();
+    }
+    
+    /** Check the checkboxes of the selected rows (after the rows were rendered) */
+    Grid.prototype.update_selection = function() {
+        var selection = this.selection;
+        this.$grid.find(".grid_select").each(function() {
+            $(this).prop("checked", selection.all != !!selection.ids[$(this).val()]);
+        });
+        this.$grid.find(".grid_select_all").prop("checked", selection.all);
+    }
+    
+    /**
+     * Run the bulk-action with the given name on the selected rows (see Grid.action). Actions reporting their
+     * progress send a json-line after each chunk, which triggers the event grid:action_progress. Afterwards
+     * the selection is cleared, the event grid:action_finished is triggered and the grid is reloaded.
+     * @param name The name of the action
+     * @param question The question the user has to confirm before or an empty string
+     */
+    Grid.prototype.runAction = function(name, question) {
+        var self = this;
+        var ids = $.map(this.selection.ids, function(value, id) { return id; });
+        if(!this.selection.all && !ids.length) {
+            this.debug("no rows selected");
+            return;
+        }
+        if(question && !confirm(question))
+            return;
+        
+        var params = this.get_params();
+        params['action'] = name;
+        params['selection'] = {'all': this.selection.all, 'ids': ids};
+        
+        // parse the json-lines received so far
+        var parse = function(text) {
+            return $.map(text.split("\n"), function(line) {
+                return $.trim(line) ? JSON.parse(line) : null;
+            });
+        };
+        var received = 0;
+        var $progress = $('<span class="grid_action_progress"></span>').appendTo(this.$grid.find(".grid_actions"));
+        
+        this.debug("running action " + name);
+        this.$grid.addClass("grid_loading");
+        $.ajax({
+            'type': 'POST',
+            'url': this.action_url,
+            'data': {'grid_data': JSON.stringify(params)},
+            'dataType': 'text',
+            'xhrFields': {
+                'onprogress': function(event) {
+                    var text = event.target.responseText;
+                    var end = text.lastIndexOf("\n") + 1;
+                    $.each(parse(text.substring(received, end)), function(i, progress) {
+                        $progress.text(progress.done + " / " + progress.total);
+                        self.$grid.trigger("grid:action_progress", [self, progress]);
+                    });
+                    received = Math.max(received, end);
+                }
+            },
+            'success': function(text) {
+                var results = parse(text);
+                self.$grid.removeClass("grid_loading");
+                self.selection = {'all': false, 'ids': {}};
+                self.$grid.trigger("grid:action_finished", [self, results[results.length - 1]]);
+                self.reload();
+            },
+            'error': function() {
+                self.$grid.removeClass("grid_loading");
+                $progress.remove();
+                self.error_handler(self, "An error occured while running the action!", params);
+            }
+        });
+    }
+    
+    /** Reset sorting, filter, search and page */
+    Grid.prototype.reset = function() {
+        this.page = 1;
+        this.cursor = null;
+        this.sorting = {};
+        this.filter = {};
+        this.filterNr = 0;
+        this.search_text = "";
+        $("#grid_" + this.id + "_search").val("");
+        this.reload();
+    }
+    
     /** 
-     * This function is called, once a reload of the page is issued 
+     * This function is called, once a reload of the page is issued. If only the rows 
+     * changed (rows_only) and the grid renders on the client, only the rows are requested.
+     * If a delay is given, the reload waits for the given time in ms and is replaced by any
+     * reload issued in the meantime (used while typing).
      */
-    Grid.prototype.reload = function() {
+    Grid.prototype.reload = function(rows_only, delay) {
+        var self = this;
+        clearTimeout(this.reload_timer);
+        this.reload_timer = null;
+        if(delay) {
+            this.reload_timer = setTimeout(function() {
+                self.reload(rows_only);
+            }, delay);
+            return;
+        }
+        
+        var params = this.get_params();
+        var json = rows_only && this.client_rendering && !this.infinite_scroll && this.$grid.children("table").length;
+        if(json) {
+            params['format'] = 'json';
+            if(!this.columns)
+                params['columns'] = true;
+        }
+        
+        // the same state is already requested, so the running request is kept
+        var data = JSON.stringify(params);
+        if(this.xhr && this.xhr_data == data) {
+            this.debug("same state already requested");
+            return;
+        }
+        
+        // abort the running request, whose response would be outdated
+        if(this.xhr) {
+            this.debug("aborting outdated request");
+            this.xhr.abort();
+        }
+        
         this.debug("starting reload...");
+        params['client'] = this.client;
+        params['version'] = ++this.version;
+        this.xhr_data = data;
+        this.xhr = json ? this.request_rows(params) : this.post_request(params);
+    }
+    
+    /**
+     * Send the state to the server. The callbacks are only called for the response of the latest
+     * request. Aborted and outdated requests are ignored.
+     * @param params The state of the grid, which is sent as grid_data
+     * @param dataType The expected type of the response (html or json)
+     * @param success Function getting the response
+     * @param background If true, the grid isn't marked as loading
+     * @return The jqXHR of the request
+     */
+    Grid.prototype.send = function(params, dataType, success, background) {
+        var self = this;
+        var version = params['version'];
+        var finish = function() {
+            if(version != self.version)
+                return false;
+            self.xhr = null;
+            self.xhr_data = null;
+            self.$grid.removeClass("grid_loading");
+            return true;
+        };
         
-        params = {}
+        // the client-id and version would make each url unique, so GET-requests leave them out
+        var data = {'grid_data': JSON.stringify(params)};
+        if(this.get_requests) {
+            var state = $.extend({}, params);
+            delete(state['client']);
+            delete(state['version']);
+            data = {'grid_state': Grid.encode_state(state)};
+        }
         
-        // load hashurl-data
-        params['page'] = 1;
+        if(!background)
+            this.$grid.addClass("grid_loading");
+        return $.ajax({
+            'type': this.get_requests ? 'GET' : 'POST',
+            'url': this.url,
+            'data': data,
+            'dataType': dataType,
+            'success': function(data) {
+                if(finish()) {
+                    self.debug("received Answer");
+                    success(data);
+                    self.$grid.trigger("grid:reloaded", [self, params]);
+                }
+            },
+            'error': function(xhr, textStatus) {
+                if(finish() && textStatus != "abort")
+                    self.error_handler(self, "An error occured while Loading!", params);
+            }
+        });
+    }
+    
+    /**
+     * Return the url to export the data of the grid with the current filters and sorting
+     * @param url The url of the view calling Grid.export
+     * @param format The export-format (csv, jsonl or xlsx), which is appended as parameter `format`
+     */
+    Grid.prototype.export_url = function(url, format) {
+        var params = this.get_params();
+        delete(params['page']);
+        delete(params['cursor']);
+        return url + (url.indexOf("?") < 0 ? "?" : "&") + $.param({'grid_data': JSON.stringify(params), 'format': format});
+    }
+    
+    /** Return the current state of the grid, which is sent as grid_data */
+    Grid.prototype.get_params = function() {
+        var params = {};
+        params['page'] = this.page;
+        if(this.cursor)
+            params['cursor'] = this.cursor;
+        params['sorting'] = this.sorting;
+        params['filter'] = [];
+        $.each(this.filter, function(nr, f) {
+            params['filter'].push(f);
+        });
+        if(this.search_text)
+            params['search'] = this.search_text;
         
         // extra-callback-params
         $.each(this.extra_callback_params, function(key, value) {
             params[key] = value;
         });
-        
-        this.post_request(params);
+        return params;
     }
     
     /**
@@ -229,22 +611,169 @@ var Grid = (function() {
      */
     Grid.prototype.post_request = function(params) {
         var self = this;
+        return this.send(params, 'html', function(html) {
+            self.$grid.html(html);
+            self.state_id = self.$grid.children(".grid_state_id").val() || null;
+            self.update_selection();
+            if(self.infinite_scroll)
+                self.init_scroll();
+        });
+    }
+    
+    /**
+     * Request the rows as json and replace only the body of the table and the paginator
+     */
+    Grid.prototype.request_rows = function(params) {
+        var self = this;
+        return this.send(params, 'json', function(data) {
+            self.state_id = data.state_id || null;
+            self.update_rows(data);
+        });
+    }
+    
+    /** Escape a value, so it can be inserted as html */
+    function escape(value) {
+        if(value === null || value === undefined)
+            return "";
+        return String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+    }
+    
+    /**
+     * Render the rows of a json-response as html
+     * @param rows The rows of the response
+     * @param offset The index of the first row, which determines the alternating classes
+     * @return Array with the html of each row
+     */
+    Grid.prototype.render_rows = function(rows, offset) {
+        var id = this.id;
+        var columns = this.columns;
+        return $.map(rows, function(row, i) {
+            var html = ['<tr id="grid__' + id + '__' + escape(row[0]) + '" class="' + ((offset + i) % 2 ? 'even' : 'odd') + '">'];
+            for(var c = 0; c < columns.length; ++c)
+                html.push('<td>' + (columns[c].html ? (row[c + 1] || "") : escape(row[c + 1])) + '</td>');
+            html.push('</tr>');
+            return html.join("");
+        });
+    }
+    
+    /**
+     * Render the rows of the json-response and update the table, the paginator and the sort-icons
+     */
+    Grid.prototype.update_rows = function(data) {
+        if(data.columns)
+            this.columns = data.columns;
+        
+        var html = this.render_rows(data.rows, 0);
+        if(!data.rows.length)
+            html.push('<tr class="grid_empty"><td colspan="' + this.columns.length + '"></td></tr>');
+        
+        this.$grid.find("table > tbody").html(html.join(""));
+        this.update_selection();
+        this.$grid.find(".grid_paginator").html(data.paginator);
+        if(data.footer)
+            this.$grid.find("table > tfoot > tr").html('<td>' + data.footer.join('</td><td>') + '</td>');
+        
+        // move the sort-icon to the sorted column
+        this.$grid.find(".grid_sort_icon").remove();
+        if(this.sorting.column) {
+            var ascending = this.sorting.direction == 1;
+            $("#" + this.id + "_" + this.sorting.column).prepend(
+                '<img class="grid_sort_icon ' + (ascending ? 'ascending' : 'descending') + '" src="' + 
+                static_url + '/img/grid/' + (ascending ? 'sort_asc' : 'sort_desc') + '.png"/>');
+        }
+    }
+    
+    
+    /**
+     * Start the infinite scrolling, once the view was loaded. The rows rendered by the server are the
+     * first window, the following windows are requested as json while scrolling. All loaded rows are
+     * kept as html, but only the ones near the visible area are inserted into the table.
+     */
+    Grid.prototype.init_scroll = function() {
+        var self = this;
+        var $area = this.$grid.find(".grid_scroll");
+        var $rows = $area.find("table > tbody > tr").not(".grid_empty");
         
-        // The callback-Function 
-        var callback = function(responseText, textStatus, XMLHttpRequest) {
-            self.debug("received Answer");
-            self.$grid.removeClass("grid_loading");
-            
-            if(textStatus == "success") {
-                self.$grid.trigger("grid:reloaded", [self, params]);
-            }
-            else {
-                self.error_handler(self, "An error occured while Loading!", params);
-            }
+        this.scroll = {
+            '$area': $area,
+            '$body': $area.find("table > tbody"),
+            'rows': $rows.map(function() { return this.outerHTML; }).get(),
+            'page': this.page,
+            'has_next': $area.attr("data-has-next") == "true",
+            'cursor': $area.attr("data-next-cursor") || null,
+            'row_height': $rows.first().outerHeight() || 20,
+            'first': 0,
+            'last': $rows.length
         };
+        $area.scroll(function() {
+            self.update_scroll();
+        });
+        this.update_scroll();
+    }
+    
+    /**
+     * Insert the rows within the visible area into the table. The rows above and below are replaced
+     * by empty rows of the same height. The next window is requested, before its end is reached.
+     */
+    Grid.prototype.update_scroll = function() {
+        var s = this.scroll;
+        var visible = Math.ceil(s.$area.height() / s.row_height);
+        var first = Math.max(0, Math.floor(s.$area.scrollTop() / s.row_height) - Grid.SCROLL_MARGIN);
+        var last = Math.min(s.rows.length, first + visible + 2 * Grid.SCROLL_MARGIN);
         
-        this.$grid.addClass("grid_loading");   
-        this.$grid.load(this.url, {'grid_data': params}, callback);
+        if(first != s.first || last != s.last) {
+            s.first = first;
+            s.last = last;
+            var html = [];
+            if(first > 0)
+                html.push('<tr class="grid_spacer" style="height: ' + (first * s.row_height) + 'px;"></tr>');
+            html.push(s.rows.slice(first, last).join(""));
+            if(last < s.rows.length)
+                html.push('<tr class="grid_spacer" style="height: ' + ((s.rows.length - last) * s.row_height) + 'px;"></tr>');
+            s.$body.html(html.join(""));
+            this.update_selection();
+        }
+        
+        if(s.has_next && !this.xhr && s.rows.length - last < visible + Grid.SCROLL_MARGIN)
+            this.request_window();
+    }
+    
+    /**
+     * Request the next window of rows in the background. It is requested like the next page, but the
+     * server only returns the rows
+     */
+    Grid.prototype.request_window = function() {
+        var self = this;
+        var s = this.scroll;
+        var params = this.get_params();
+        params['page'] = s.page + 1;
+        if(s.cursor)
+            params['cursor'] = s.cursor;
+        params['format'] = 'json';
+        params['window'] = true;
+        if(!this.columns)
+            params['columns'] = true;
+        
+        this.debug("requesting window " + params['page']);
+        this.xhr_data = JSON.stringify(params);
+        params['client'] = this.client;
+        params['version'] = ++this.version;
+        this.xhr = this.send(params, 'json', function(data) {
+            if(data.columns)
+                self.columns = data.columns;
+            
+            // the server returns the first page, if the requested one doesn't exist (anymore)
+            if(data.page != params['page']) {
+                s.has_next = false;
+                return;
+            }
+            s.rows = s.rows.concat(self.render_rows(data.rows, s.rows.length));
+            s.page = data.page;
+            s.has_next = data.has_next;
+            s.cursor = data.next_cursor;
+            s.last = -1;
+            self.update_scroll();
+        }, true);
     }
     
     
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+This file contains the tests of the grid. They use the models of django.contrib.auth and
+django.contrib.contenttypes, which must be installed.
+"""
+
+# Lib-Imports
+import simplejson
+
+# Django imports
+from django.contrib.auth.models import Permission
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import translation
+
+# Grid-Imports
+from grid import Grid
+from columns import CurrencyColumn, DateColumn, NumberColumn, TextColumn
+from exceptions import InvalidFilterException
+from search import highlight
+
+
+class PermissionGrid(Grid):
+    grid_id = 'permissions'
+    url = '/permissions/'
+    name = TextColumn(filterable=True)
+    content_type = TextColumn()
+
+
+class GridTest(TestCase):
+
+    def view(self, state, **settings):
+        """ Render the view of the PermissionGrid with the given state """
+        request = RequestFactory().post('/permissions/', {'grid_data': simplejson.dumps(state)})
+        return PermissionGrid.view(request, Permission.objects.all(), settings=settings).render()
+
+    def test_json_related_object(self):
+        """ A column showing a related object sends its text, when the grid renders json """
+        data = simplejson.loads(self.view({'format': 'json', 'sorting': {'column': 'name', 'direction': 1}}))
+        permission = Permission.objects.order_by('name')[0]
+        self.assertEqual(data['rows'][0], [permission.pk, permission.name, unicode(permission.content_type)])
+
+    def test_unknown_filter_mode_escaped(self):
+        """ The id of an unknown filter-mode is sent by the client, so it must be escaped in the header """
+        html = self.view({'filter': [{'nr': 0, 'id': 'name', 'mode': '<script>alert(1)</script>', 'values': ['x']}]})
+        self.assertNotIn('<script>alert(1)</script>', html)
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt;', html)
+
+    def test_filter_values_not_strings(self):
+        """ Values of filters, that are not strings (like numbers sent as json), don't fail the request """
+        self.assertEqual(NumberColumn.Filter(False).convert('<', [5]), [{'mode': '<', 'value': 5}])
+        self.assertEqual(NumberColumn.Filter(True).convert('=', [2.5]), [{'mode': '=', 'value': 2.5}])
+        self.assertEqual(DateColumn.Filter().extract_date(2011), {'year': 2011, 'month': None, 'day': None})
+        self.assertRaises(InvalidFilterException, DateColumn.Filter().extract_date, None)
+
+    def test_highlight_entities(self):
+        """ Terms matching the name of an entity don't break the escaped content """
+        render = highlight(lambda row: u"Tom & <Jerry>", ['amp', 'jerry'])
+        self.assertEqual(render(None), u"Tom &amp; &lt;<mark>Jerry</mark>&gt;")
+
+    def test_count_aggregate_plain(self):
+        """ The count of a currency-column is rendered as integer, the sum with the currency """
+        for aggregate, expected in (('count', u"1800"), ('sum', u"1.800,00 EUR")):
+            column = CurrencyColumn(symbol=u"EUR", aggregate=aggregate)
+            column.initialize('amount')
+            self.assertEqual(column.render_aggregate(1800).strip(), expected)
+
+    def test_localized_number_follows_language(self):
+        """ Localized number-columns use the separators of the language active for the request """
+        column = NumberColumn(digits=2, localize=True)
+        column.initialize('amount')
+        with self.settings(USE_L10N=True):
+            with translation.override('de'):
+                self.assertEqual(column.render_aggregate(2.5), u"2,50")
+            with translation.override('en'):
+                self.assertEqual(column.render_aggregate(2.5), u"2.50")